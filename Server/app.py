@@ -1,12 +1,13 @@
-from flask import Flask, render_template, jsonify, request, send_file, redirect, url_for
+from flask import Flask, Response, render_template, jsonify, request, send_file, redirect, url_for
 import json
 import os
-import csv
 import io
-from datetime import datetime
-from collections import Counter
+import time
 from werkzeug.utils import secure_filename
-from sdk_risk import compute_risk_from_logs
+from sdk_risk import RiskColumns, RiskCounters
+from log_store import LOG_FILE, iter_records, migrate_legacy_log
+from log_cache import LogCache
+import log_export
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
 
@@ -17,7 +18,6 @@ from werkzeug.middleware.dispatcher import DispatcherMiddleware
 from obfuscation import app as obf_app
 
 app = Flask(__name__)
-LOG_FILE = "sdk_logs.json"
 
 
 UPLOAD_FOLDER = "uploads"
@@ -28,18 +28,16 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
+log_cache = LogCache(LOG_FILE)
+risk_counters = RiskCounters(LOG_FILE)
+risk_columns = RiskColumns()
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
 def load_logs():
-    logs = []
-    if os.path.exists(LOG_FILE):
-        with open(LOG_FILE, "r") as f:
-            try:
-                logs = json.load(f)
-            except:
-                logs = []
-        for item in logs:
-            if "Timestamp" not in item:
-                item["Timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    return logs
+    # Shared, read-only columns; only records appended since the last call
+    # are parsed.
+    return log_cache.refresh().store
 
 
 app.wsgi_app = DispatcherMiddleware(app.wsgi_app, {
@@ -49,23 +47,17 @@ app.wsgi_app = DispatcherMiddleware(app.wsgi_app, {
 # ---------------- SDK Dashboard ----------------
 @app.route("/")
 def index():
-    logs = load_logs()
+    total_requests, sdk_list, sdk_counter = log_cache.summary()
     search = request.args.get("search", "").lower()
     sdk_filter = request.args.get("sdk", "")
+    domain = sdk_filter if sdk_filter != "All" else ""
 
-    if search:
-        logs = [
-            d for d in logs
-            if search in d['App Domain'].lower()
-               or any(search in key.lower() for key in d.get("Data Sent", {}).keys())
-        ]
-
-    if sdk_filter and sdk_filter != "All":
-        logs = [d for d in logs if d['App Domain'] == sdk_filter]
+    # Only the first page is rendered; the page fetches the rest from
+    # /api/logs as the table is scrolled.
+    page, matching, more, generation = log_cache.page(search, domain, limit=PAGE_SIZE)
+    logs = [record for _, record in page]
+    chart_counts = log_cache.domain_counts(search, domain)
 
-    sdk_list = sorted(set(d['App Domain'] for d in load_logs()))
-    total_requests = len(load_logs())
-    sdk_counter = Counter(d['App Domain'] for d in load_logs())
     unique_sdks = len(sdk_counter)
 
     return render_template(
@@ -76,7 +68,13 @@ def index():
         sdk_filter=sdk_filter,
         total_requests=total_requests,
         unique_sdks=unique_sdks,
-        sdk_counter=sdk_counter
+        sdk_counter=sdk_counter,
+        chart_counts=chart_counts,
+        matching=matching,
+        cursor=page[-1][0] if page else -1,
+        more=more,
+        generation=generation,
+        page_size=PAGE_SIZE
     )
 
 
@@ -153,12 +151,46 @@ def download_pdf():
 
 @app.route("/risk")
 def risk_analysis():
-    final_score, details, total_logs = compute_risk_from_logs()
+    final_score, details, total_logs = risk_counters.compute_risk()
     return render_template("risk.html", final_score=final_score, details=details, total_logs=total_logs)
 
+@app.route("/api/risk")
+def api_risk():
+    # -> {"now": epoch, "windows": {"5m"|"1h"|"session": {"total": {...}, "domains": [...]}}}
+    now = time.time()
+    load_logs()
+    log_cache.sync(risk_columns)
+    return jsonify({"now": now, "windows": risk_columns.scores(now)})
+
 @app.route("/api/logs")
 def api_logs():
-    return jsonify(load_logs())
+    # ?limit=&after=<id>&fields=a,b&search=&sdk=&since=<epoch>&until=<epoch>
+    # -> {"items": [...], "next": <id for after>, "more": bool, "total": n,
+    #     "generation": token that changes when the log is reset and ids restart}
+    try:
+        limit = min(max(int(request.args.get("limit", PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        after = int(request.args.get("after", -1))
+        since, until = (int(request.args[k]) if request.args.get(k) else None for k in ("since", "until"))
+    except ValueError:
+        return jsonify({"error": "limit, after, since and until must be integers"}), 400
+    fields = [f for f in request.args.get("fields", "").split(",") if f]
+    search = request.args.get("search", "").lower()
+    sdk_filter = request.args.get("sdk", "")
+
+    load_logs()
+    page, total, more, generation = log_cache.page(search, sdk_filter if sdk_filter != "All" else "", after, limit, since, until)
+
+    def generate():
+        yield '{"items": ['
+        for n, (record_id, record) in enumerate(page):
+            if fields:
+                record = {f: record[f] for f in fields if f in record}
+            yield ("," if n else "") + json.dumps({"id": record_id, **record})
+        next_after = page[-1][0] if page else after
+        yield (f'], "next": {next_after}, "more": {json.dumps(more)}, "total": {total}, '
+               f'"generation": {json.dumps(generation)}}}')
+
+    return Response(generate(), mimetype="application/json")
 
 @app.route("/download")
 def download():
@@ -166,18 +198,19 @@ def download():
 
 @app.route("/export")
 def export():
-    export_file = "sdk_export.csv"
-    logs = load_logs()
-    with open(export_file, mode='w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(["App Domain", "Data Sent", "Timestamp"])
-        for item in logs:
-            writer.writerow([
-                item.get("App Domain", ""),
-                ", ".join([f"{k}: {v}" for k, v in item.get("Data Sent", {}).items()]),
-                item.get("Timestamp", "")
-            ])
-    return send_file(export_file, as_attachment=True)
+    # ?format=csv (default), csv.gz, parquet or arrow; streamed as it is read
+    fmt = request.args.get("format", "csv")
+    if fmt not in log_export.FORMATS:
+        return f"Unknown export format {fmt!r}", 400
+    if not log_export.available(fmt):
+        return f"{fmt} export needs pyarrow (pip install pyarrow)", 501
+    filename, mimetype, _ = log_export.FORMATS[fmt]
+    migrate_legacy_log()
+    return Response(
+        log_export.export(iter_records(LOG_FILE), fmt),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
 
 if __name__ == "__main__":
     # run main app on port 5050
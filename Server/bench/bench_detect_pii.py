@@ -0,0 +1,77 @@
+# Micro-benchmark: SDKSniffer.detect_pii with the precompiled PIIMatcher
+# versus the original loop of re.search over every entry in `patterns`.
+#
+#   python bench/bench_detect_pii.py [flows]
+
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sdk_sniffer
+
+
+class LegacyMatcher:
+    def search_all(self, key, val_str, stats=None):
+        text = f"{key}:{val_str}"
+        matches = []
+        for pii_type, regex in sdk_sniffer.patterns.items():
+            match = re.search(regex, text)
+            if match:
+                matches.append((pii_type, match))
+        return matches
+
+
+def make_payloads(count, seed=7):
+    rnd = random.Random(seed)
+    noise_keys = ["event_name", "ts", "session", "screen", "duration", "seq", "sdk_name", "retry"]
+    pii = {
+        "phone": "9876543210", "email": "john.doe@example.com", "lat": "28.613939",
+        "lng": "77.209023", "device_model": "Pixel 7", "os_version": "14",
+        "android_id": "9774d56d682e549c", "locale": "en_IN", "imei": "490154203237518",
+        "user_name": "John Smith", "card": "4111111111111111",
+    }
+    payloads = []
+    for _ in range(count):
+        body = {k: rnd.choice(["open", "1712345678", "abc123", "home", "3"]) for k in noise_keys}
+        for key in rnd.sample(sorted(pii), 4):
+            body[key] = pii[key]
+        body["context"] = {"app": {"package_name": "com.example.shop", "app_version": "5.2.1"},
+                           "events": [{"event_name": "view", "ts": "1712345678"}] * 3}
+        payloads.append(body)
+    return payloads
+
+
+def run(matcher, payloads):
+    sdk_sniffer.pii_matcher = matcher
+    sniffer = sdk_sniffer.SDKSniffer()
+    start = time.perf_counter()
+    results = [sniffer.detect_pii(p) for p in payloads]
+    return time.perf_counter() - start, results
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    payloads = make_payloads(count)
+    precompiled = sdk_sniffer.pii_matcher
+
+    legacy_time, legacy_results = run(LegacyMatcher(), payloads)
+    new_time, new_results = run(precompiled, payloads)
+    sdk_sniffer.pii_matcher = precompiled
+
+    if legacy_results != new_results:
+        sys.exit("results differ between legacy loop and PIIMatcher")
+    print(f"flows:          {count}")
+    print(f"legacy loop:    {count / legacy_time:10.1f} flows/sec")
+    print(f"PIIMatcher:     {count / new_time:10.1f} flows/sec")
+    print(f"speedup:        {legacy_time / new_time:10.2f}x")
+    info = precompiled.key_candidates.cache_info()
+    print(f"key cache:      {info.hits / max(1, info.hits + info.misses):10.2%} hit rate "
+          f"({info.currsize} keys)")
+
+
+if __name__ == "__main__":
+    main()
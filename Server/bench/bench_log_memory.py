@@ -0,0 +1,97 @@
+# Memory benchmark: the dashboard's in-memory leak log as the parsed list
+# of record dicts it used to keep versus LogCache's columns (log_columns).
+#
+#   python bench/bench_log_memory.py [records]
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_cache import LogCache
+from log_store import format_timestamp, normalize_record
+
+DOMAINS = [f"{name}.{tld}" for name in ("app-measurement", "graph.facebook", "api.mixpanel", "sdk.appsflyer",
+                                        "settings.crashlytics", "events.branch", "api.amplitude", "t.appsflyer",
+                                        "ads.unity3d", "mobile.adjust", "api.onesignal", "in.appcenter")
+           for tld in ("com", "io", "net")]
+KEYS = ["device_model", "manufacturer", "os_version", "sdk_level", "screen_width", "screen_height",
+        "application_package_name", "app_version", "build_number", "android_id", "advertiser_id",
+        "uuid", "email", "phone", "latitude", "longitude", "locale", "timezone", "imei", "ip_address"]
+
+
+def make_lines(count, seed=3):
+    # One simulated session: a handful of devices and users whose values
+    # recur in record after record, as in real sniffer logs.
+    rnd = random.Random(seed)
+    values = {key: [f"{key}-{n:04d}" for n in range(rnd.randint(3, 40))] for key in KEYS}
+    start = 1_760_000_000
+    lines = []
+    for n in range(count):
+        domain = rnd.choice(DOMAINS)
+        data = {key: sorted({rnd.choice(values[key]) for _ in range(rnd.randint(1, 2))})
+                for key in rnd.sample(KEYS, rnd.randint(2, 7))}
+        epoch = start + n // 5
+        lines.append(json.dumps({
+            "App Domain": domain,
+            "Timestamp": format_timestamp(epoch),
+            "Epoch": epoch,
+            "Data Sent": data,
+            "Request URL": f"https://{domain}/v{rnd.randint(1, 3)}/{rnd.choice(['events', 'track', 'config', 'batch'])}",
+        }))
+    return lines
+
+
+def load_dicts(path):
+    # what LogCache held before: every record as parsed
+    records = []
+    epoch = 0
+    with open(path, "rb") as f:
+        for line in f:
+            record = json.loads(line)
+            epoch = normalize_record(record, epoch)
+            records.append(record)
+    return records
+
+
+def measure(load):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = load()
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sdk_logs.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(make_lines(count)) + "\n")
+
+        records, dict_bytes, dict_time = measure(lambda: load_dicts(path))
+        # LogCache also keeps its search indexes; both are counted
+        cache, column_bytes, column_time = measure(lambda: LogCache(path).refresh())
+        store = cache.store
+
+        for record_id in range(0, count, max(1, count // 1000)):
+            if store.record(record_id) != records[record_id]:
+                sys.exit(f"record {record_id} differs after the round trip through the columns")
+
+    print(f"records:          {count}")
+    print(f"list of dicts:    {dict_bytes / count:10.1f} bytes/record  ({dict_time:.2f} s to load)")
+    print(f"LogCache columns: {column_bytes / count:10.1f} bytes/record  ({column_time:.2f} s to load, indexes included)")
+    print(f"reduction:        {dict_bytes / column_bytes:10.1f}x")
+    print(f"string tables:    {len(store.domains)} domains, {len(store.keys)} keys, "
+          f"{len(store.values)} values, {len(store.urls)} URLs; {len(store.extras)} records kept whole")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# Micro-benchmark: sdk_risk.tally_categories with the flattened key ->
+# category table versus the original loop over every category per key.
+#
+#   python bench/bench_risk_tally.py [records]
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sdk_risk
+
+
+def legacy_classify_key(key):
+    k = key.lower().strip()
+    for cat, keys in sdk_risk.CATEGORY_KEYS.items():
+        if k in keys:
+            return cat
+    return None
+
+
+def legacy_tally_categories(logs):
+    counts = {c: 0 for c in sdk_risk.CATEGORY_KEYS.keys()}
+    for entry in logs:
+        data = entry.get("Data Sent", {})
+        if isinstance(data, dict):
+            for key, val in data.items():
+                cat = legacy_classify_key(key)
+                if cat:
+                    counts[cat] += 1
+        else:
+            s = str(data).lower()
+            for cat, keys in sdk_risk.CATEGORY_KEYS.items():
+                for k in keys:
+                    if k in s:
+                        counts[cat] += 1
+    return counts
+
+
+def make_logs(count, seed=7):
+    # Mostly dict records as written by the sniffer, with unknown keys and
+    # odd casing, plus a few free-text Data Sent values.
+    rnd = random.Random(seed)
+    keys = sorted(sdk_risk.KEY_CATEGORY) + ["imei", "ip_address", "session_id", "Email", " Phone "]
+    logs = []
+    for _ in range(count):
+        if rnd.random() < 0.02:
+            data = " ".join(rnd.choices(keys + ["payload", "value"], k=rnd.randint(1, 12)))
+        else:
+            data = {k: ["v"] for k in rnd.sample(keys, rnd.randint(1, 8))}
+        logs.append({"App Domain": "example.com", "Data Sent": data})
+    return logs
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    logs = make_logs(count)
+
+    start = time.perf_counter()
+    legacy = legacy_tally_categories(logs)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    flat = sdk_risk.tally_categories(logs)
+    flat_time = time.perf_counter() - start
+
+    if legacy != flat:
+        sys.exit(f"counts differ:\n legacy: {legacy}\n flat:   {flat}")
+    print(f"records:        {count}")
+    print(f"legacy loop:    {count / legacy_time:12.0f} records/sec")
+    print(f"flattened dict: {count / flat_time:12.0f} records/sec")
+    print(f"speedup:        {legacy_time / flat_time:12.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# Throughput benchmark for the whole SDKSniffer.request pipeline, driven by
+# synthetic flows from mitmproxy's test helpers (no proxy, no network).
+#
+# The flows come from bench/corpus/sniffer_flows.jsonl. Each entry also
+# records the PII the sniffer found in it when the corpus was generated;
+# the benchmark checks those first and exits non-zero if detection changed.
+#
+#   python bench/bench_sniffer.py [--rounds N] [--set option=value ...] [--no-check]
+#
+# Regenerate the corpus after an intended detection change with
+#   python bench/make_corpus.py
+
+import argparse
+import gzip
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from mitmproxy import http
+from mitmproxy.test import taddons, tflow, tutils
+
+import sdk_sniffer
+
+CORPUS_FILE = os.path.join(BENCH_DIR, "corpus", "sniffer_flows.jsonl")
+_generated = {}
+
+
+def generate_body(spec):
+    # Bodies too large to check in are described by a spec and rebuilt
+    # deterministically: a JSON batch of analytics events, a few of which
+    # carry PII.
+    rnd = random.Random(spec.get("seed", 0))
+    events = []
+    for i in range(spec["count"]):
+        event = {
+            "event_name": rnd.choice(["screen_view", "add_to_cart", "scroll", "purchase"]),
+            "ts": 1712345678 + i,
+            "session": f"s{rnd.randrange(10 ** 6):06d}",
+            "params": {"duration": rnd.randrange(5000), "seq": i},
+        }
+        if i % spec.get("pii_every", 1000) == 0:
+            event["user"] = {"email": f"user{i}@example.com", "phone": f"98765{i % 100000:05d}"}
+        events.append(event)
+    return json.dumps({"batch": events}).encode()
+
+
+def load_corpus(path=CORPUS_FILE):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def make_flow(entry):
+    if "generate" in entry:
+        # built once; the flows of every round share the bytes
+        spec_key = json.dumps(entry["generate"], sort_keys=True)
+        if spec_key not in _generated:
+            _generated[spec_key] = generate_body(entry["generate"])
+        body = _generated[spec_key]
+    else:
+        body = entry.get("body", "").encode()
+    headers = list(entry.get("headers", {}).items())
+    if entry.get("content_encoding") == "gzip":
+        body = gzip.compress(body, mtime=0)
+        headers.append(("content-encoding", "gzip"))
+    req = tutils.treq(
+        method=entry["method"].encode(),
+        headers=http.Headers([(k.encode(), v.encode()) for k, v in headers]),
+        content=b"",
+    )
+    req.url = entry["url"]
+    # raw bytes as they came off the wire; Request.make would encode again
+    req.raw_content = body
+    return tflow.tflow(req=req)
+
+
+def normalize(data_sent):
+    return {k: sorted(str(x) for x in v) for k, v in data_sent.items()}
+
+
+def check(sniffer, corpus):
+    failures = 0
+    for entry in corpus:
+        found = normalize(sniffer.scan_request(make_flow(entry).request))
+        if found != entry["expect"]:
+            failures += 1
+            print(f"MISMATCH {entry['name']}:\n  expected {entry['expect']}\n  found    {found}")
+    return failures
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def parse_options(pairs):
+    options = {}
+    for pair in pairs:
+        name, _, value = pair.partition("=")
+        options[name] = value
+    return options
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SDKSniffer.request on the synthetic corpus")
+    parser.add_argument("--rounds", type=int, default=10, help="passes over the corpus")
+    parser.add_argument("--set", dest="options", action="append", default=[],
+                        help="sniffer option, e.g. --set sniffer_schema_cache=true")
+    parser.add_argument("--no-check", action="store_true", help="skip the expected-detection check")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    # load() truncates the log in the working directory; keep it away
+    # from a real capture.
+    os.chdir(tempfile.mkdtemp(prefix="sniffer-bench-"))
+    sniffer = sdk_sniffer.SDKSniffer()
+    with taddons.context(sniffer) as tctx:
+        for name, value in parse_options(args.options).items():
+            tctx.options.set(f"{name}={value}")
+
+        if not args.no_check:
+            failures = check(sniffer, corpus)
+            if failures:
+                sys.exit(f"{failures} of {len(corpus)} corpus flows differ from the expected detections")
+            print(f"check:          {len(corpus)} corpus flows match")
+
+        flows = [make_flow(entry) for entry in corpus for _ in range(args.rounds)]
+        random.Random(1).shuffle(flows)
+        latencies = []
+        start = time.perf_counter()
+        for flow in flows:
+            t = time.perf_counter()
+            sniffer.request(flow)
+            latencies.append(time.perf_counter() - t)
+        sniffer.close_pool()
+        sniffer.flush_log()
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"flows:          {len(flows)} ({len(corpus)} corpus flows x {args.rounds})")
+    print(f"throughput:     {len(flows) / elapsed:10.1f} flows/sec")
+    print(f"latency p50:    {statistics.median(latencies) * 1000:10.3f} ms")
+    print(f"latency p99:    {p99 * 1000:10.3f} ms")
+    rss = peak_rss_mb()
+    if rss is not None:
+        print(f"peak RSS:       {rss:10.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
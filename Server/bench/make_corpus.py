@@ -0,0 +1,107 @@
+# Writes bench/corpus/sniffer_flows.jsonl: synthetic SDK traffic for
+# bench_sniffer.py, with the detections the current sniffer makes on each
+# flow stored as "expect". Rerun after an intended change to patterns or
+# detect_pii and review the diff of the corpus file.
+#
+#   python bench/make_corpus.py
+
+import json
+import os
+import random
+import sys
+import tempfile
+from urllib.parse import urlencode
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from mitmproxy.test import taddons
+
+import bench_sniffer
+import sdk_sniffer
+
+JSON = {"content-type": "application/json"}
+FORM = {"content-type": "application/x-www-form-urlencoded"}
+BOUNDARY = "----sniffbench"
+MULTIPART = {"content-type": f"multipart/form-data; boundary={BOUNDARY}"}
+
+DEVICE = {
+    "device_model": "Pixel 7", "os_version": "14", "locale": "en_IN", "tz": "Asia/Kolkata",
+    "android_id": "9774d56d682e549c", "app_version": "5.2.1", "package_name": "com.example.shop",
+}
+PEOPLE = [
+    {"email": "john.doe@example.com", "phone": "9876543210", "user_name": "John Smith",
+     "lat": "28.613939", "lng": "77.209023", "imei": "490154203237518"},
+    {"email": "priya.k@example.in", "phone": "+91 9123456780", "full_name": "Priya Kumar",
+     "city": "Mumbai", "zip": "400001", "card": "4111111111111111"},
+    {"email": "a.b@example.org", "mobile_number": "9988776655", "dob": "1990-01-01",
+     "gender": "female", "advertiser_id": "38400000-8cf0-11bd-b23e-10b96e40000d"},
+]
+
+
+def multipart(fields):
+    parts = [f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}\r\n'
+             for k, v in fields.items()]
+    return "".join(parts) + f"--{BOUNDARY}--\r\n"
+
+
+def entries():
+    rnd = random.Random(42)
+    for i, person in enumerate(PEOPLE):
+        event = {"event_name": "login", "ts": 1712345678 + i, "user": person, "device": DEVICE}
+        yield {"name": f"json_event_{i}", "method": "POST",
+               "url": "https://analytics.example.com/v1/events", "headers": JSON,
+               "body": json.dumps(event)}
+        batch = {"events": [{"event_name": rnd.choice(["view", "tap"]), "seq": n, "props": {"k": n}}
+                            for n in range(50)], "context": {"device": DEVICE, "user": person}}
+        yield {"name": f"json_batch_{i}", "method": "POST",
+               "url": "https://sdk.example.net/batch", "headers": JSON, "body": json.dumps(batch)}
+        yield {"name": f"json_nested_string_{i}", "method": "POST",
+               "url": "https://crash.example.io/report", "headers": JSON,
+               "body": json.dumps({"report": "ok", "meta": json.dumps(person)})}
+        yield {"name": f"form_{i}", "method": "POST",
+               "url": "https://ads.example.com/conv", "headers": FORM,
+               "body": urlencode({**person, "event": "install", "sdk": "3.1"})}
+        yield {"name": f"multipart_{i}", "method": "POST",
+               "url": "https://upload.example.com/profile", "headers": MULTIPART,
+               "body": multipart({**person, "note": "profile update"})}
+        query = {"operationName": "UpdateUser", "variables": {"input": person},
+                 "query": f'mutation {{ updateUser(email: "{person["email"]}") {{ id }} }}'}
+        yield {"name": f"graphql_{i}", "method": "POST",
+               "url": "https://api.example.com/graphql", "headers": JSON, "body": json.dumps(query)}
+        yield {"name": f"gzip_json_{i}", "method": "POST",
+               "url": "https://telemetry.example.com/collect", "headers": JSON,
+               "content_encoding": "gzip", "body": json.dumps({"device": DEVICE, "user": person})}
+        yield {"name": f"query_{i}", "method": "GET",
+               "url": "https://pixel.example.com/p?" + urlencode({**person, "ev": "open"}),
+               "headers": {}, "body": ""}
+    yield {"name": "raw_text", "method": "POST", "url": "https://logs.example.com/ingest",
+           "headers": {"content-type": "text/plain"},
+           "body": "user phone: 9876543210 email john.doe@example.com device Pixel 7"}
+    yield {"name": "no_pii_heartbeat", "method": "POST", "url": "https://hb.example.com/ping",
+           "headers": JSON, "body": json.dumps({"seq": 1, "status": "alive"})}
+    yield {"name": "huge_json", "method": "POST", "url": "https://bulk.example.com/upload",
+           "headers": JSON, "generate": {"count": 25000, "seed": 3, "pii_every": 5000}}
+    yield {"name": "huge_gzip_json", "method": "POST", "url": "https://bulk.example.com/upload",
+           "headers": JSON, "content_encoding": "gzip",
+           "generate": {"count": 25000, "seed": 4, "pii_every": 5000}}
+
+
+def main():
+    os.chdir(tempfile.mkdtemp(prefix="sniffer-corpus-"))  # load() truncates ./sdk_logs.jsonl
+    sniffer = sdk_sniffer.SDKSniffer()
+    out = []
+    with taddons.context(sniffer):
+        for entry in entries():
+            found = sniffer.scan_request(bench_sniffer.make_flow(entry).request)
+            entry["expect"] = bench_sniffer.normalize(found)
+            out.append(entry)
+    os.makedirs(os.path.dirname(bench_sniffer.CORPUS_FILE), exist_ok=True)
+    with open(bench_sniffer.CORPUS_FILE, "w", encoding="utf-8") as f:
+        for entry in out:
+            f.write(json.dumps(entry, sort_keys=True) + "\n")
+    print(f"wrote {len(out)} flows to {bench_sniffer.CORPUS_FILE}")
+
+
+if __name__ == "__main__":
+    main()
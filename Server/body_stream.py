@@ -0,0 +1,191 @@
+# body_stream.py
+# Incremental Content-Encoding decoding for the sniffer. Bodies are
+# decompressed chunk by chunk with a ceiling on the decompressed size, so a
+# compressed upload cannot expand to hundreds of MB inside the proxy.
+import codecs
+import io
+import itertools
+import zlib
+
+def _import_brotli():
+    # Prefer a release whose Decompressor can cap its output (brotli or
+    # brotlicffi >= 1.2); mitmproxy pins older brotli, which cannot.
+    found = None
+    for name in ("brotli", "brotlicffi"):
+        try:
+            module = __import__(name)
+        except ImportError:
+            continue
+        if hasattr(module.Decompressor(), "can_accept_more_data"):
+            return module, True
+        found = found or module
+    return found, False
+
+
+brotli, BROTLI_BOUNDED = _import_brotli()
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CHUNK_SIZE = 64 * 1024
+BROTLI_SLICE = 64  # compressed bytes per call to a brotli < 1.2 decoder
+
+
+def _iter_identity(chunks):
+    yield from chunks
+
+
+def _iter_zlib(chunks, wbits):
+    d = zlib.decompressobj(wbits)
+    for data in chunks:
+        while data:
+            out = d.decompress(data, CHUNK_SIZE)
+            if out:
+                yield out
+            data = d.unconsumed_tail
+        if d.eof:
+            return
+    tail = d.flush()
+    if tail:
+        yield tail
+
+
+def _iter_gzip(chunks):
+    return _iter_zlib(chunks, 16 + zlib.MAX_WBITS)
+
+
+def _iter_deflate(chunks):
+    # "deflate" is zlib-wrapped by the spec but raw deflate in practice,
+    # so sniff the zlib header the way mitmproxy does.
+    chunks = iter(chunks)
+    first = next(chunks, b"")
+    wbits = zlib.MAX_WBITS if first[:1] == b"\x78" else -zlib.MAX_WBITS
+
+    def rejoined():
+        yield first
+        yield from chunks
+    return _iter_zlib(rejoined(), wbits)
+
+
+def _iter_brotli(chunks):
+    d = brotli.Decompressor()
+    if not BROTLI_BOUNDED:
+        # Output cannot be capped, so input is fed in small slices and each
+        # is expanded at once; BodyStream stops at max_size, past which at
+        # most one slice's output (tens of MB for a crafted body) is held.
+        for data in chunks:
+            for i in range(0, len(data), BROTLI_SLICE):
+                out = d.process(data[i:i + BROTLI_SLICE])
+                if out:
+                    yield out
+                if d.is_finished():
+                    return
+        return
+    for data in chunks:
+        out = d.process(data, output_buffer_limit=CHUNK_SIZE)
+        # the rest of this input's output, CHUNK_SIZE at a time
+        while out:
+            yield out
+            out = d.process(b"", output_buffer_limit=CHUNK_SIZE)
+        if d.is_finished():
+            return
+
+
+class _ChunkReader(io.RawIOBase):
+    # File-like view of a chunk iterator, read only as far as asked.
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.pending = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        if not self.pending:
+            self.pending = next(self.chunks, b"")
+        n = min(len(buf), len(self.pending))
+        buf[:n] = self.pending[:n]
+        self.pending = self.pending[n:]
+        return n
+
+
+def _iter_zstd(chunks):
+    # zstandard's stream reader pulls input as needed and honours read sizes
+    reader = zstandard.ZstdDecompressor().stream_reader(_ChunkReader(chunks))
+    while True:
+        out = reader.read(CHUNK_SIZE)
+        if not out:
+            return
+        yield out
+
+
+DECODERS = {
+    "": _iter_identity,
+    "identity": _iter_identity,
+    "none": _iter_identity,
+    "gzip": _iter_gzip,
+    "x-gzip": _iter_gzip,
+    "deflate": _iter_deflate,
+}
+if brotli is not None:
+    DECODERS["br"] = _iter_brotli
+if zstandard is not None:
+    DECODERS["zstd"] = _iter_zstd
+
+
+class BodyStream:
+    """Decoded text of a request body, produced in chunks.
+
+    `content_encoding` may list several codings ("gzip, br"); they are
+    undone in reverse order. Iteration stops once `max_size` decompressed
+    bytes have been produced and sets `truncated`. Unknown codings raise
+    ValueError when iteration starts.
+    """
+
+    def __init__(self, raw, content_encoding="", max_size=64 * 1024 * 1024):
+        self.raw = raw or b""
+        self.codings = [c.strip() for c in content_encoding.lower().split(",")]
+        self.max_size = max_size
+        self.size = 0
+        self.truncated = False
+
+    def iter_bytes(self):
+        stream = (self.raw[i:i + CHUNK_SIZE] for i in range(0, len(self.raw), CHUNK_SIZE))
+        for coding in reversed(self.codings):
+            if coding not in DECODERS:
+                raise ValueError(f"Unsupported content-encoding: {coding}")
+            stream = DECODERS[coding](stream)
+        if "gzip" in self.codings:
+            stream = self._unwrap_inner_gzip(stream)
+        for chunk in stream:
+            room = self.max_size - self.size
+            if len(chunk) > room:
+                chunk = chunk[:room]
+                self.truncated = True
+            self.size += len(chunk)
+            if chunk:
+                yield chunk
+            if self.truncated:
+                return
+
+    @staticmethod
+    def _unwrap_inner_gzip(stream):
+        # Some apps gzip the payload themselves before the HTTP client
+        # compresses it again; the sniffer has always unwrapped both.
+        first = next(stream, b"")
+        rest = itertools.chain([first], stream)
+        if first[:2] == b"\x1f\x8b":
+            rest = _iter_gzip(rest)
+        yield from rest
+
+    def __iter__(self):
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        for chunk in self.iter_bytes():
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        text = decoder.decode(b"", final=True)
+        if text:
+            yield text
@@ -0,0 +1,162 @@
+# card_check.py
+# Luhn validation and card-brand classification for numeric candidates.
+# Candidates are validated in batches, as NumPy digit arrays when NumPy is
+# installed, and classified with a prefix trie built from card_ranges.json.
+import json
+import os
+import re
+
+try:
+    import numpy as np
+except ImportError:  # optional speed-up
+    np = None
+
+# Below this many candidates the array setup costs more than it saves.
+VECTORIZE_MIN = 64
+
+
+def check_luhn(number: str) -> bool:
+    n_digits = len(number)
+    n_sum = 0
+    is_second = False
+    for i in range(n_digits - 1, -1, -1):
+        d = ord(number[i]) - ord('0')
+        if is_second:
+            d *= 2
+        n_sum += d // 10
+        n_sum += d % 10
+        is_second = not is_second
+    return n_sum % 10 == 0
+
+
+def luhn_valid_many(numbers):
+    """check_luhn over a list of digit strings, as a list of bools."""
+    if np is None or len(numbers) < VECTORIZE_MIN:
+        return [check_luhn(n) for n in numbers]
+    valid = [False] * len(numbers)
+    by_length = {}
+    for i, number in enumerate(numbers):
+        if number.isascii():
+            by_length.setdefault(len(number), []).append(i)
+        else:
+            # \d also matches non-ASCII digits, which only check_luhn handles
+            valid[i] = check_luhn(number)
+    for length, idx in by_length.items():
+        digits = np.frombuffer("".join(numbers[i] for i in idx).encode("ascii"), dtype=np.uint8)
+        digits = digits.reshape(len(idx), length).astype(np.int32) - 48
+        doubled = digits[:, length - 2::-2] * 2
+        total = digits[:, length - 1::-2].sum(axis=1) + (doubled // 10 + doubled % 10).sum(axis=1)
+        for i, ok in zip(idx, (total % 10 == 0).tolist()):
+            valid[i] = ok
+    return valid
+
+
+# Issuer identification number ranges, one scheme per entry. The first
+# scheme (in file order) whose prefix and length match a number wins.
+CARD_RANGES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "card_ranges.json")
+
+
+def _expand_prefix(prefix):
+    # "51-55" -> 51, 52, ..., 55; both ends must have the same length
+    low, sep, high = prefix.partition("-")
+    if not sep:
+        return [prefix]
+    if len(low) != len(high) or not (low.isdigit() and high.isdigit()) or int(low) > int(high):
+        raise ValueError(f"Invalid prefix range {prefix!r}")
+    return [str(n).zfill(len(low)) for n in range(int(low), int(high) + 1)]
+
+
+def load_card_ranges(path=CARD_RANGES_FILE):
+    """Read a card range file as a list of (brand, prefixes, lengths)."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    ranges = []
+    for scheme in data["schemes"]:
+        prefixes = []
+        for prefix in scheme["prefixes"]:
+            prefixes.extend(_expand_prefix(str(prefix)))
+        if not all(p.isdigit() for p in prefixes):
+            raise ValueError(f"Invalid prefix for {scheme['brand']}")
+        ranges.append((scheme["brand"], prefixes, [int(n) for n in scheme["lengths"]]))
+    return ranges
+
+
+class CardPrefixTrie:
+    def __init__(self, ranges):
+        # node: {digit: child, None: [(priority, brand, lengths), ...]}
+        self.root = {}
+        for priority, (brand, prefixes, lengths) in enumerate(ranges):
+            for prefix in prefixes:
+                node = self.root
+                for digit in prefix:
+                    node = node.setdefault(digit, {})
+                node.setdefault(None, []).append((priority, brand, frozenset(lengths)))
+
+    @classmethod
+    def from_file(cls, path=CARD_RANGES_FILE):
+        return cls(load_card_ranges(path))
+
+    def classify(self, number):
+        length = len(number)
+        best = None
+        node = self.root
+        for digit in number:
+            node = node.get(digit)
+            if node is None:
+                break
+            for rule in node.get(None, ()):
+                if length in rule[2] and (best is None or rule[0] < best[0]):
+                    best = rule
+        return best[1] if best else "Unknown"
+
+
+card_trie = CardPrefixTrie.from_file()
+
+_CARD_TYPE_PATTERNS = {
+    "Visa": re.compile(r"(?<!\.)\b4[0-9]{12}(?:[0-9]{3})?\b(?!\.)"),
+    "MasterCard": re.compile(r"(?<!\.)\b5[1-5][0-9]{14}\b(?!\.)"),
+    "American Express": re.compile(r"(?<!\.)\b3[47][0-9]{13}\b(?!\.)"),
+    "Discover": re.compile(r"(?<!\.)\b6(?:011|5[0-9]{2})[0-9]{12}\b(?!\.)"),
+    "JCB": re.compile(r"(?<!\.)\b(?:2131|1800|35\d{3})\d{11}\b(?!\.)"),
+    "Diners Club": re.compile(r"(?<!\.)\b3(?:0[0-5]|[68][0-9])[0-9]{11}\b(?!\.)"),
+    "Maestro": re.compile(r"(?<!\.)\b(5018|5020|5038|56|57|58|6304|6759|676[1-3])\d{8,15}\b(?!\.)"),
+    "Verve": re.compile(r"(?<!\.)\b(506[01]|507[89]|6500)\d{12,15}\b(?!\.)"),
+}
+
+
+def get_card_type(card_number, trie=None):
+    if card_number.isascii() and card_number.isdigit():
+        return (trie or card_trie).classify(card_number)
+    # the original brand regexes accept non-ASCII digits in places; keep
+    # their answer for those
+    for card_type, pattern in _CARD_TYPE_PATTERNS.items():
+        if pattern.match(card_number):
+            return card_type
+    return "Unknown"
+
+
+class CardBatch:
+    """Credit-card candidates of one detect_pii call, validated together."""
+
+    def __init__(self, trie=None):
+        self.trie = trie or card_trie
+        self.numbers = []
+        self.full_keys = []
+
+    def add(self, number, full_key):
+        self.numbers.append(number)
+        self.full_keys.append(full_key)
+
+    def resolve(self, result, hits=None):
+        if not self.numbers:
+            return
+        for number, full_key, ok in zip(self.numbers, self.full_keys, luhn_valid_many(self.numbers)):
+            if not ok:
+                continue
+            card_type = get_card_type(number, self.trie)
+            if card_type != "Unknown":
+                result.setdefault("credit_card", set()).add(f"{number} ({card_type})")
+                if hits is not None:
+                    hits.setdefault(full_key, set()).add("credit_card")
+        self.numbers = []
+        self.full_keys = []
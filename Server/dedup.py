@@ -0,0 +1,71 @@
+# dedup.py
+# Duplicate suppression for sniffer records. A record is identified by a
+# fingerprint of its (App Domain, Data Sent) pair.
+import hashlib
+import json
+import math
+from collections import OrderedDict
+
+POLICIES = ("exact", "bloom")
+
+
+def fingerprint(domain, data_sent):
+    canonical = json.dumps([domain, data_sent], sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).digest()
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, digest):
+        # double hashing over the two halves of the 128-bit fingerprint
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, digest):
+        for pos in self._positions(digest):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, digest):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(digest))
+
+
+class Deduplicator:
+    """Remembers the fingerprints of the most recent `window` records exactly.
+
+    With the "exact" policy older fingerprints are forgotten, so a record
+    repeated after more than `window` distinct records is logged again.
+    With the "bloom" policy evicted fingerprints move into a Bloom filter
+    sized for `bloom_capacity` records, which keeps suppressing them at the
+    cost of dropping roughly `bloom_error_rate` of genuinely new records
+    once the window has overflowed.
+    """
+
+    def __init__(self, window=100_000, policy="exact", bloom_capacity=10_000_000, bloom_error_rate=0.001):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown dedup policy: {policy}")
+        self.window = window
+        self.recent = OrderedDict()
+        self.bloom = BloomFilter(bloom_capacity, bloom_error_rate) if policy == "bloom" else None
+
+    def seen(self, domain, data_sent):
+        """Return True for a duplicate, otherwise remember the record."""
+        digest = fingerprint(domain, data_sent)
+        if digest in self.recent:
+            self.recent.move_to_end(digest)
+            return True
+        if self.bloom is not None and digest in self.bloom:
+            return True
+        self.recent[digest] = None
+        if len(self.recent) > self.window:
+            evicted, _ = self.recent.popitem(last=False)
+            if self.bloom is not None:
+                self.bloom.add(evicted)
+        return False
+
+    def __len__(self):
+        return len(self.recent)
@@ -0,0 +1,162 @@
+# har_stream.py
+# HAR files from browsers and other capture tools, read and written one
+# entry at a time. Reading parses the file incrementally with json_stream,
+# so memory is bounded by the largest single entry, not the archive.
+import base64
+import codecs
+import json
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+from mitmproxy import http
+
+from body_stream import BodyStream
+from json_stream import iter_items
+
+READ_SIZE = 1024 * 1024
+HAR_BODY_LIMIT = 64 * 1024
+
+
+def is_har(path):
+    # HAR is JSON; mitmproxy dumps are tnetstrings and never start with "{"
+    with open(path, "rb") as f:
+        head = f.read(64)
+    return head.lstrip(b"\xef\xbb\xbf \t\r\n").startswith(b"{")
+
+
+def iter_text(path):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(READ_SIZE)
+            if not data:
+                break
+            text = decoder.decode(data)
+            if text:
+                yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+def iter_har_entries(path):
+    """Yield the entries of a HAR file as dicts, one at a time."""
+    for entry in iter_items(iter_text(path), "log.entries.item"):
+        if isinstance(entry, dict) and isinstance(entry.get("request"), dict):
+            yield entry
+
+
+def entry_timestamp(entry):
+    started = entry.get("startedDateTime")
+    try:
+        return datetime.fromisoformat(started.replace("Z", "+00:00")).timestamp()
+    except (AttributeError, ValueError):
+        return None
+
+
+def entry_to_request(entry):
+    """The request of a HAR entry as a mitmproxy Request."""
+    req = entry["request"]
+    headers = http.Headers(
+        (h["name"].encode(), h["value"].encode())
+        for h in req.get("headers", [])
+        if not h["name"].startswith(":")  # HTTP/2 pseudo-headers
+    )
+    post = req.get("postData") or {}
+    if "text" in post:
+        text = post["text"] or ""
+        content = base64.b64decode(text) if post.get("encoding") == "base64" else text.encode("utf-8", "surrogateescape")
+    elif post.get("params"):
+        content = urlencode([(p["name"], p.get("value", "")) for p in post["params"]]).encode()
+    else:
+        content = b""
+    if post.get("mimeType") and "content-type" not in headers:
+        headers["content-type"] = post["mimeType"]
+    # HAR bodies are stored decoded, so drop codings that no longer apply
+    headers.pop("content-encoding", None)
+    request = http.Request.make(req.get("method", "GET"), req["url"], content, headers)
+    timestamp = entry_timestamp(entry)
+    if timestamp is not None:
+        request.timestamp_start = timestamp
+    return request
+
+
+def _har_headers(headers):
+    return [{"name": k, "value": v} for k, v in headers.items(multi=True)]
+
+
+def _body_text(req, body_limit):
+    # At most body_limit + 1 characters of the decoded body: decompression
+    # stops after 4 bytes (the longest UTF-8 character) per character.
+    # A body that cannot be decoded is kept as sent, like get_text(strict=False).
+    max_size = 4 * (body_limit + 1)
+    try:
+        return "".join(BodyStream(req.raw_content, req.headers.get("content-encoding", ""), max_size))
+    except Exception:
+        return "".join(BodyStream(req.raw_content, "", max_size))
+
+
+def request_to_entry(req, data_sent=None, body_limit=HAR_BODY_LIMIT):
+    """A compact HAR entry for `req`: the request only, with an empty
+    response. `data_sent` is stored in the custom "_pii" field."""
+    text = _body_text(req, body_limit)
+    entry = {
+        "startedDateTime": datetime.fromtimestamp(req.timestamp_start, timezone.utc).isoformat(),
+        "time": 0,
+        "request": {
+            "method": req.method,
+            "url": req.pretty_url,
+            "httpVersion": req.http_version,
+            "cookies": [],
+            "headers": _har_headers(req.headers),
+            "queryString": [{"name": k, "value": v} for k, v in req.query.items(multi=True)],
+            "headersSize": -1,
+            "bodySize": len(req.raw_content or b""),
+        },
+        "response": {
+            "status": 0, "statusText": "", "httpVersion": "", "cookies": [], "headers": [],
+            "content": {"size": 0, "mimeType": ""}, "redirectURL": "", "headersSize": -1, "bodySize": -1,
+        },
+        "cache": {},
+        "timings": {"send": 0, "wait": 0, "receive": 0},
+    }
+    if text:
+        entry["request"]["postData"] = {
+            "mimeType": req.headers.get("content-type", ""),
+            "text": text[:body_limit],
+        }
+        if len(text) > body_limit:
+            entry["request"]["postData"]["_truncated"] = True
+    if data_sent:
+        entry["_pii"] = {k: sorted(str(x) for x in v) for k, v in data_sent.items()}
+    return entry
+
+
+class HarWriter:
+    """Writes a HAR file entry by entry; close() finishes the document."""
+
+    def __init__(self, path, creator="sdk_sniffer"):
+        self._file = open(path, "w", encoding="utf-8")
+        self._file.write(
+            '{"log": {"version": "1.2", "creator": '
+            + json.dumps({"name": creator, "version": "1.0"})
+            + ', "entries": [\n'
+        )
+        self.count = 0
+
+    def add(self, entry):
+        if self.count:
+            self._file.write(",\n")
+        self._file.write(json.dumps(entry))
+        self.count += 1
+
+    def close(self):
+        if not self._file.closed:
+            self._file.write("\n]}}\n")
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
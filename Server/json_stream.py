@@ -0,0 +1,297 @@
+# json_stream.py
+# Incremental, event-based JSON parsing for request bodies too large to
+# materialize with json.loads. Text is fed in chunks; memory is bounded by
+# the nesting depth and the longest single token.
+import re
+from json.decoder import scanstring
+
+_WS = re.compile(r"[ \t\n\r]*")
+_NUMBER = re.compile(r"-?(?:0|[1-9]\d*)(\.\d+)?([eE][-+]?\d+)?")
+_NUMBER_CHARS = re.compile(r"[-+.eE0-9]*")
+# the rest of a string up to its closing quote or a trailing backslash
+_STRING_REST = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.S)
+_LITERALS = {"t": ("true", True), "f": ("false", False), "n": ("null", None)}
+
+_VALUE, _KEY, _COLON, _COMMA, _DONE = range(5)
+
+
+class JSONEventParser:
+    """Turns JSON text into (event, value) tuples as it arrives.
+
+    Events are "start_map", "map_key", "end_map", "start_array",
+    "end_array" and "value"; scalars are decoded the way json.loads would.
+    """
+
+    def __init__(self):
+        self.buf = ""
+        self.pos = 0
+        self.stack = []
+        self.state = _VALUE
+        self.allow_close = False
+        # A string or number cut off at the end of a chunk: the chunks
+        # that follow are collected in `parts` and only scanned for its end,
+        # so a long token costs time linear in its length.
+        self.partial = None  # None, "string" or "number"
+        self.escaped = False  # an open string's last character is a lone backslash
+        self.parts = []
+
+    def feed(self, text):
+        if self.partial is not None:
+            self.parts.append(text)
+            if not self._token_ends(text):
+                return []
+            text = self._take_parts()
+        self.buf = self.buf[self.pos:] + text
+        self.pos = 0
+        events = []
+        self._parse(events, final=False)
+        return events
+
+    def _token_ends(self, text):
+        if self.partial == "number":
+            return _NUMBER_CHARS.match(text).end() < len(text)
+        start = 1 if self.escaped else 0
+        if start > len(text):
+            return False
+        end = _STRING_REST.match(text, start).end()
+        if end < len(text) and text[end] == '"':
+            return True
+        # otherwise the match stopped at the end or at a trailing backslash
+        self.escaped = end < len(text)
+        return False
+
+    def _take_parts(self):
+        text = "".join(self.parts)
+        self.parts = []
+        self.partial = None
+        self.escaped = False
+        return text
+
+    def close(self):
+        if self.partial is not None:
+            self.buf = self.buf[self.pos:] + self._take_parts()
+            self.pos = 0
+        events = []
+        self._parse(events, final=True)
+        if self.state != _DONE or self.buf[self.pos:].strip():
+            raise ValueError("Unexpected end of JSON input")
+        return events
+
+    def _error(self, msg):
+        raise ValueError(f"{msg} at offset {self.pos}")
+
+    def _after_value(self):
+        self.state = _COMMA if self.stack else _DONE
+        self.allow_close = False
+
+    def _parse(self, events, final):
+        buf = self.buf
+        end = len(buf)
+        while True:
+            pos = _WS.match(buf, self.pos).end()
+            self.pos = pos
+            if pos >= end:
+                return
+            c = buf[pos]
+            state = self.state
+
+            if state == _COMMA:
+                if c == ",":
+                    self.pos = pos + 1
+                    self.state = _KEY if self.stack[-1] == "map" else _VALUE
+                elif c in "}]":
+                    self._close_container(c, events)
+                else:
+                    self._error("Expecting ',' delimiter")
+                continue
+
+            if state == _KEY:
+                if c == '"':
+                    token = self._string(final)
+                    if token is None:
+                        return
+                    events.append(("map_key", token))
+                    self.state = _COLON
+                elif c == "}" and self.allow_close:
+                    self._close_container(c, events)
+                else:
+                    self._error("Expecting property name enclosed in double quotes")
+                continue
+
+            if state == _COLON:
+                if c != ":":
+                    self._error("Expecting ':' delimiter")
+                self.pos = pos + 1
+                self.state = _VALUE
+                self.allow_close = False
+                continue
+
+            if state == _DONE:
+                self._error("Extra data")
+
+            # _VALUE
+            if c == "{":
+                self.pos = pos + 1
+                self.stack.append("map")
+                events.append(("start_map", None))
+                self.state = _KEY
+                self.allow_close = True
+            elif c == "[":
+                self.pos = pos + 1
+                self.stack.append("array")
+                events.append(("start_array", None))
+                self.state = _VALUE
+                self.allow_close = True
+            elif c == "]" and self.allow_close:
+                self._close_container(c, events)
+            elif c == '"':
+                token = self._string(final)
+                if token is None:
+                    return
+                events.append(("value", token))
+                self._after_value()
+            elif c == "-" or "0" <= c <= "9":
+                if not final and _NUMBER_CHARS.match(buf, pos).end() >= end:
+                    # the number may continue in the next chunk
+                    self.partial = "number"
+                    return
+                m = _NUMBER.match(buf, pos)
+                if m is None:
+                    self._error("Invalid number")
+                text = m.group()
+                events.append(("value", float(text) if m.group(1) or m.group(2) else int(text)))
+                self.pos = m.end()
+                self._after_value()
+            elif c in _LITERALS:
+                word, value = _LITERALS[c]
+                if buf.startswith(word, pos):
+                    events.append(("value", value))
+                    self.pos = pos + len(word)
+                    self._after_value()
+                elif not final and word.startswith(buf[pos:]):
+                    return
+                else:
+                    self._error("Expecting value")
+            else:
+                self._error("Expecting value")
+
+    def _string(self, final):
+        end = _STRING_REST.match(self.buf, self.pos + 1).end()
+        if end >= len(self.buf) or self.buf[end] != '"':
+            if final:
+                self._error("Unterminated string")
+            # the string continues in the next chunk
+            self.partial = "string"
+            self.escaped = end < len(self.buf)
+            return None
+        token, self.pos = scanstring(self.buf, self.pos + 1)
+        return token
+
+    def _close_container(self, c, events):
+        kind = self.stack.pop()
+        if (c == "}") != (kind == "map"):
+            self._error("Mismatched bracket")
+        events.append(("end_map" if kind == "map" else "end_array", None))
+        self.pos += 1
+        self._after_value()
+
+
+def iter_events(chunks):
+    parser = JSONEventParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+def iter_leaves(chunks):
+    """Yield (key, full_key, value) for every scalar stored under an object key.
+
+    full_key follows SDKSniffer.detect_pii: object keys are joined with
+    dots and list positions add nothing. Scalars directly inside lists are
+    skipped, as detect_pii skips them.
+    """
+    # one [path, current_key] frame per open container; key is None in lists
+    frames = []
+    for event, value in iter_events(chunks):
+        if event == "map_key":
+            frames[-1][1] = value
+        elif event == "value":
+            if frames and frames[-1][1] is not None:
+                path, key = frames[-1]
+                yield key, f"{path}.{key}" if path else key, value
+        elif event == "start_map" or event == "start_array":
+            if frames and frames[-1][1] is not None:
+                path, key = frames[-1]
+                path = f"{path}.{key}" if path else key
+            else:
+                path = frames[-1][0] if frames else ""
+            frames.append([path, None])
+        else:
+            frames.pop()
+
+
+def walk_leaves(parsed, parent_key=""):
+    """iter_leaves for an already parsed object."""
+    if isinstance(parsed, dict):
+        for key, value in parsed.items():
+            full_key = f"{parent_key}.{key}" if parent_key else key
+            if isinstance(value, (dict, list)):
+                yield from walk_leaves(value, full_key)
+            else:
+                yield key, full_key, value
+    elif isinstance(parsed, list):
+        for item in parsed:
+            yield from walk_leaves(item, parent_key)
+
+
+def iter_items(chunks, prefix):
+    """Yield each complete value whose path is `prefix`.
+
+    Paths are dotted map keys with "item" for array elements, so the
+    entries of a HAR file are at "log.entries.item". Only the value being
+    built is held in memory.
+    """
+    target = prefix.split(".") if prefix else []
+    stack = []  # [kind, key] per open container outside the target
+    building = None  # containers of the value under construction
+    keys = None
+    for event, value in iter_events(chunks):
+        if building is not None:
+            if event == "map_key":
+                keys[-1] = value
+            elif event == "value":
+                _add(building[-1], keys[-1], value)
+            elif event == "start_map" or event == "start_array":
+                container = {} if event == "start_map" else []
+                _add(building[-1], keys[-1], container)
+                building.append(container)
+                keys.append(None)
+            else:
+                done = building.pop()
+                keys.pop()
+                if not building:
+                    building = keys = None
+                    yield done
+            continue
+
+        if event == "map_key":
+            stack[-1][1] = value
+        elif event == "end_map" or event == "end_array":
+            stack.pop()
+        elif len(stack) == len(target) and [k for _, k in stack] == target:
+            if event == "value":
+                yield value
+            else:
+                building = [{} if event == "start_map" else []]
+                keys = [None]
+        elif event == "start_map":
+            stack.append(["map", None])
+        elif event == "start_array":
+            stack.append(["array", "item"])
+
+
+def _add(container, key, value):
+    if isinstance(container, dict):
+        container[key] = value
+    else:
+        container.append(value)
@@ -0,0 +1,233 @@
+# log_cache.py
+# In-process model of the sniffer's leak log for the dashboard. The log is
+# append-only, so a refresh reads just the bytes added since the last one;
+# the file is reread from the start only when it was truncated or replaced
+# (told apart by size, inode and a fingerprint of its first bytes).
+# Records are held in the compact columns of log_columns.
+import bisect
+import itertools
+import json
+import os
+import threading
+import time
+from array import array
+from collections import Counter
+
+from log_columns import LogColumns
+from log_store import HEAD_BYTES, LOG_FILE, head_digest, migrate_legacy_log, normalize_record
+
+# generation tokens stay unique across dashboard restarts
+_STARTED = time.time_ns()
+_RESETS = itertools.count()
+
+
+class LogCache:
+    """Parsed records of a JSONL log plus aggregates kept up to date.
+
+    `store` is shared by all callers and must be treated as read-only;
+    the domain aggregates are read through `summary`. Records are also indexed by domain,
+    by lowercased Data Sent key and by time for `filter`. Every record
+    gets an integer "Epoch" (see log_store.normalize_record).
+    """
+
+    def __init__(self, path=LOG_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self._reset(None)
+
+    def _reset(self, file_id):
+        self.file_id = file_id  # (st_dev, st_ino) of the file read so far
+        # changes whenever record ids restart from 0
+        self.generation = f"{_STARTED:x}.{next(_RESETS)}"
+        self.offset = 0
+        self.head = ""  # head_digest of the bytes read so far
+        self.store = LogColumns()
+        self.domain_counter = Counter()
+        self._sdk_list = None
+        # postings: arrays of record ids in ascending order
+        self.by_domain = {}
+        self.by_key = {}
+        self._time_order = None  # (sorted epochs, ids) once the log is out of order
+        self._in_order = True
+        self._memo = None
+
+    @property
+    def total(self):
+        return len(self.store)
+
+    def refresh(self):
+        with self.lock:
+            if self.file_id is None:
+                migrate_legacy_log(dst=self.path)
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                if len(self.store):
+                    self._reset(None)
+                return self
+            file_id = (st.st_dev, st.st_ino)
+            with open(self.path, "rb") as f:
+                if (file_id != self.file_id or st.st_size < self.offset
+                        or (self.offset and head_digest(f, self.offset) != self.head)):
+                    # replaced (migration, rotation) or truncated (new session)
+                    self._reset(file_id)
+                if st.st_size > self.offset:
+                    self._read_new(f, int(st.st_mtime))
+        return self
+
+    def summary(self):
+        """Refresh, then return (total records, sorted domains, Counter of
+        records per domain), taken together under the lock. The list is
+        shared and read-only; the Counter is a copy."""
+        self.refresh()
+        with self.lock:
+            if self._sdk_list is None:
+                self._sdk_list = sorted(self.domain_counter)
+            return len(self.store), self._sdk_list, Counter(self.domain_counter)
+
+    def _read_new(self, f, mtime):
+        added = 0
+        # a record without any time inherits the one before it
+        epoch = self.store.epoch[-1] if len(self.store) else mtime
+        f.seek(self.offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                # the writer has not finished this record yet
+                break
+            self.offset += len(line)
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(item, dict):
+                continue
+            epoch = normalize_record(item, epoch)
+            self._index(self.store.append(item), item)
+            added += 1
+        if self.offset < HEAD_BYTES or not self.head:
+            self.head = head_digest(f, self.offset)
+        if added:
+            self._sdk_list = None
+            self._time_order = None
+
+    def _index(self, record_id, item):
+        domain = item.get("App Domain")
+        if "App Domain" in item:
+            self.domain_counter[domain] += 1
+        if isinstance(domain, str):
+            self.by_domain.setdefault(domain, array("i")).append(record_id)
+        data = item.get("Data Sent")
+        if isinstance(data, dict):
+            for key in {str(k).lower() for k in data}:
+                self.by_key.setdefault(key, array("i")).append(record_id)
+        if record_id and item["Epoch"] < self.store.epoch[record_id - 1]:
+            # e.g. an older capture appended by replay.py --append
+            self._in_order = False
+
+    def _time_ids(self, since, until):
+        # Ids with since <= Epoch < until in ascending order; None is open.
+        # Binary search over the epochs, or over a sorted copy of them when
+        # the log is not in time order.
+        epochs = self.store.epoch
+        if self._in_order:
+            ids = None
+        else:
+            if self._time_order is None:
+                order = array("i", sorted(range(len(epochs)), key=epochs.__getitem__))
+                self._time_order = (array("q", (epochs[i] for i in order)), order)
+            epochs, ids = self._time_order
+        lo = 0 if since is None else bisect.bisect_left(epochs, since)
+        hi = len(epochs) if until is None else bisect.bisect_left(epochs, until)
+        if ids is None:
+            return range(lo, max(lo, hi))
+        return sorted(ids[lo:hi])
+
+    def _matching_ids(self, search, domain, since=None, until=None):
+        # Sorted ids of the matching records, or None for "all of them".
+        # Called with the lock held.
+        if not search and not domain and since is None and until is None:
+            return None
+        memo_key = (search, domain, since, until, len(self.store))
+        if self._memo is not None and self._memo[0] == memo_key:
+            return self._memo[1]
+        # Substring matches are found in the vocabularies of distinct
+        # domains and keys, which stay small however long the log gets.
+        ids = None
+        if search:
+            ids = set()
+            for name, postings in self.by_domain.items():
+                if search in name.lower():
+                    ids.update(postings)
+            for key, postings in self.by_key.items():
+                if search in key:
+                    ids.update(postings)
+        if domain:
+            postings = self.by_domain.get(domain, ())
+            ids = set(postings) if ids is None else ids.intersection(postings)
+        if since is not None or until is not None:
+            if ids is None:
+                ids = self._time_ids(since, until)
+            else:
+                lo = float("-inf") if since is None else since
+                hi = float("inf") if until is None else until
+                ids = [i for i in ids if lo <= self.store.epoch[i] < hi]
+        if not isinstance(ids, range):
+            ids = sorted(ids)
+        # paging through one result set reuses it until new records arrive
+        self._memo = (memo_key, ids)
+        return ids
+
+    def filter(self, search="", domain="", since=None, until=None):
+        """Records whose domain or a Data Sent key contains `search`
+        (lowercase), restricted to the exact `domain` and to
+        since <= Epoch < until when given."""
+        with self.lock:
+            ids = self._matching_ids(search, domain, since, until)
+            if ids is None:
+                ids = range(len(self.store))
+            return [self.store.record(i) for i in ids]
+
+    def sync(self, columns):
+        """Bring `columns` (e.g. a sdk_risk.RiskColumns) up to date with
+        the store, holding the lock so no record is seen half appended."""
+        with self.lock:
+            return columns.sync(self.store)
+
+    def domain_counts(self, search="", domain="", since=None, until=None):
+        """Number of records per App Domain among those `filter` returns,
+        counted from the columns without rebuilding the records."""
+        with self.lock:
+            ids = self._matching_ids(search, domain, since, until)
+            if ids is None:
+                return dict(self.domain_counter)
+            counts = Counter(self.store.domain[i] for i in ids)
+            named = Counter()
+            for domain_id, count in counts.items():
+                if domain_id >= 0:
+                    named[self.store.domains[domain_id]] += count
+            for i in ids:
+                if self.store.domain[i] < 0:
+                    named[self.store.record(i).get("App Domain")] += 1
+            return dict(named)
+
+    def page(self, search="", domain="", after=-1, limit=100, since=None, until=None):
+        """Up to `limit` (id, record) pairs matching `filter`'s arguments
+        with ids above `after`, the number of matches, whether more follow
+        and the generation. Ids are positions in the log and stable while
+        the generation is unchanged."""
+        with self.lock:
+            ids = self._matching_ids(search, domain, since, until)
+            if ids is None:
+                start = max(after + 1, 0)
+                selected = range(start, min(start + limit, len(self.store)))
+                total = len(self.store)
+                more = start + limit < total
+            else:
+                start = bisect.bisect_right(ids, after)
+                selected = ids[start:start + limit]
+                total = len(ids)
+                more = start + limit < total
+            return [(i, self.store.record(i)) for i in selected], total, more, self.generation
@@ -0,0 +1,153 @@
+# log_columns.py
+# Compact in-memory form of the leak log for the dashboard. Instead of a
+# dict of dicts of lists per record, records are stored as array columns
+# of ids into tables of interned strings, so a domain, PII type or value
+# seen many times is held once. Records are rebuilt as dicts on demand.
+from array import array
+
+from log_store import format_timestamp
+
+# key orders of the records the sniffer writes: make_record's, and older
+# records once log_store.normalize_record has appended "Epoch"
+LAYOUTS = (
+    ("App Domain", "Timestamp", "Epoch", "Data Sent", "Request URL"),
+    ("App Domain", "Timestamp", "Data Sent", "Request URL", "Epoch"),
+)
+_LAYOUT_IDS = {layout: n for n, layout in enumerate(LAYOUTS)}
+
+NO_VALUE = -1  # a Data Sent key with an empty list
+
+
+class StringTable:
+    """Interned strings, each stored once and referred to by its id."""
+
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def intern(self, s):
+        string_id = self.ids.get(s)
+        if string_id is None:
+            string_id = self.ids[s] = len(self.strings)
+            self.strings.append(s)
+        return string_id
+
+    def __getitem__(self, string_id):
+        return self.strings[string_id]
+
+    def __len__(self):
+        return len(self.strings)
+
+
+class LogColumns:
+    """Records of the leak log in columns.
+
+    Per record: domain id, epoch, URL id and layout, plus a run of
+    (key id, value id) pairs for its Data Sent, one per value. Records of
+    any other shape are kept whole in `extras`; their domain and epoch are
+    still in the columns. Record ids are positions in the log.
+    """
+
+    def __init__(self):
+        self.domains = StringTable()
+        self.keys = StringTable()
+        self.values = StringTable()
+        self.urls = StringTable()
+        self.domain = array("i")  # -1 when not a string
+        self.epoch = array("q")
+        self.url = array("i")
+        self.layout = array("b")  # -1 for records in extras
+        self.pair_start = array("I", [0])  # pairs of record i: pair_start[i]:pair_start[i + 1]
+        self.pair_key = array("i")
+        self.pair_value = array("i")
+        self.extras = {}
+        self._formatted = (None, None)  # last (epoch, Timestamp) checked
+
+    def __len__(self):
+        # epoch is appended last, so a record counts once it is complete
+        return len(self.epoch)
+
+    def _timestamp(self, epoch):
+        if self._formatted[0] != epoch:
+            self._formatted = (epoch, format_timestamp(epoch))
+        return self._formatted[1]
+
+    def _timestamp_or_none(self, epoch):
+        try:
+            return self._timestamp(epoch)
+        except (OverflowError, OSError, ValueError):
+            return None
+
+    def _fits(self, record):
+        # whether `record` can be rebuilt exactly from the columns
+        data = record.get("Data Sent")
+        return (
+            tuple(record) in _LAYOUT_IDS
+            and type(record["App Domain"]) is str
+            and type(record["Request URL"]) is str
+            and type(data) is dict
+            and all(type(k) is str and type(v) is list and all(type(x) is str for x in v)
+                    for k, v in data.items())
+            and record["Timestamp"] == self._timestamp_or_none(record["Epoch"])
+        )
+
+    def append(self, record):
+        """Add a record that went through log_store.normalize_record."""
+        record_id = len(self.epoch)
+        domain = record.get("App Domain")
+        self.domain.append(self.domains.intern(domain) if type(domain) is str else -1)
+        if not self._fits(record):
+            self.url.append(-1)
+            self.layout.append(-1)
+            self.pair_start.append(self.pair_start[-1])
+            self.extras[record_id] = record
+            self.epoch.append(record["Epoch"])
+            return record_id
+        self.url.append(self.urls.intern(record["Request URL"]))
+        self.layout.append(_LAYOUT_IDS[tuple(record)])
+        pairs = 0
+        for key, values in record["Data Sent"].items():
+            key_id = self.keys.intern(key)
+            for value in values or (None,):
+                self.pair_key.append(key_id)
+                self.pair_value.append(NO_VALUE if value is None else self.values.intern(value))
+                pairs += 1
+        self.pair_start.append(self.pair_start[-1] + pairs)
+        self.epoch.append(record["Epoch"])
+        return record_id
+
+    def domain_name(self, record_id):
+        domain_id = self.domain[record_id]
+        if domain_id < 0:
+            return self.record(record_id).get("App Domain")
+        return self.domains[domain_id]
+
+    def key_ids(self, record_id):
+        """Distinct Data Sent key ids of a record in order, or None for a
+        record kept in `extras`."""
+        if self.layout[record_id] < 0:
+            return None
+        key_ids = self.pair_key[self.pair_start[record_id]:self.pair_start[record_id + 1]]
+        return list(dict.fromkeys(key_ids))
+
+    def record(self, record_id):
+        """The record as it was appended. Rebuilt as a new dict, except
+        for records in `extras`, which must be treated as read-only."""
+        layout = self.layout[record_id]
+        if layout < 0:
+            return self.extras[record_id]
+        data = {}
+        start, end = self.pair_start[record_id], self.pair_start[record_id + 1]
+        for key_id, value_id in zip(self.pair_key[start:end], self.pair_value[start:end]):
+            values = data.setdefault(self.keys[key_id], [])
+            if value_id != NO_VALUE:
+                values.append(self.values[value_id])
+        epoch = self.epoch[record_id]
+        fields = {
+            "App Domain": self.domains[self.domain[record_id]],
+            "Timestamp": self._timestamp(epoch),
+            "Epoch": epoch,
+            "Data Sent": data,
+            "Request URL": self.urls[self.url[record_id]],
+        }
+        return {name: fields[name] for name in LAYOUTS[layout]}
@@ -0,0 +1,144 @@
+# log_export.py
+# Streamed exports of the leak log for the dashboard's /export route. Each
+# exporter is a generator of bytes that reads the records lazily, so a
+# download starts at once and memory does not grow with the log.
+import csv
+import io
+import json
+import zlib
+
+from log_store import format_timestamp, parse_timestamp
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet/Arrow export is optional
+    pa = pq = None
+
+CSV_ROWS_PER_CHUNK = 500
+ARROW_ROWS_PER_BATCH = 10_000
+
+FORMATS = {
+    # format: (file name, mimetype, needs pyarrow)
+    "csv": ("sdk_export.csv", "text/csv", False),
+    "csv.gz": ("sdk_export.csv.gz", "application/gzip", False),
+    "parquet": ("sdk_export.parquet", "application/vnd.apache.parquet", True),
+    "arrow": ("sdk_export.arrow", "application/vnd.apache.arrow.stream", True),
+}
+
+
+def available(fmt):
+    return fmt in FORMATS and (pa is not None or not FORMATS[fmt][2])
+
+
+def _epoch(item):
+    epoch = item.get("Epoch")
+    if type(epoch) is int and -2**53 < epoch < 2**53:
+        return epoch
+    return parse_timestamp(item.get("Timestamp"))
+
+
+def _timestamp(item):
+    if "Timestamp" in item:
+        return item["Timestamp"]
+    epoch = _epoch(item)
+    return "" if epoch is None else format_timestamp(epoch)
+
+
+def iter_csv(records):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(["App Domain", "Data Sent", "Timestamp"])
+    for n, item in enumerate(records, 1):
+        data = item.get("Data Sent", {})
+        writer.writerow([
+            item.get("App Domain", ""),
+            ", ".join([f"{k}: {v}" for k, v in data.items()]) if isinstance(data, dict) else data,
+            _timestamp(item),
+        ])
+        if n % CSV_ROWS_PER_CHUNK == 0:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+
+def iter_gzip(chunks):
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+class _ChunkSink(io.RawIOBase):
+    # Write target for pyarrow that hands the written bytes to a generator.
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _arrow_schema():
+    return pa.schema([
+        ("app_domain", pa.string()),
+        ("timestamp", pa.string()),
+        ("epoch", pa.int64()),
+        ("request_url", pa.string()),
+        ("pii_types", pa.list_(pa.string())),
+        ("data_sent", pa.string()),  # the Data Sent object as JSON
+    ])
+
+
+def _arrow_batches(records, schema):
+    columns = {name: [] for name in schema.names}
+    for item in records:
+        data = item.get("Data Sent", {})
+        columns["app_domain"].append(item.get("App Domain"))
+        columns["timestamp"].append(_timestamp(item))
+        columns["epoch"].append(_epoch(item))
+        columns["request_url"].append(item.get("Request URL"))
+        columns["pii_types"].append([str(k) for k in data] if isinstance(data, dict) else [])
+        columns["data_sent"].append(json.dumps(data))
+        if len(columns["app_domain"]) >= ARROW_ROWS_PER_BATCH:
+            yield pa.record_batch(list(columns.values()), schema=schema)
+            columns = {name: [] for name in schema.names}
+    if columns["app_domain"]:
+        yield pa.record_batch(list(columns.values()), schema=schema)
+
+
+def iter_columnar(records, fmt):
+    """Parquet ("parquet") or Arrow IPC stream ("arrow") bytes, one record
+    batch / row group at a time."""
+    schema = _arrow_schema()
+    sink = _ChunkSink()
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+    else:
+        writer = pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema)
+    for batch in _arrow_batches(records, schema):
+        writer.write_batch(batch)
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    yield sink.drain()
+
+
+def export(records, fmt):
+    if fmt == "csv":
+        return iter_csv(records)
+    if fmt == "csv.gz":
+        return iter_gzip(iter_csv(records))
+    return iter_columnar(records, fmt)
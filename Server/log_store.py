@@ -0,0 +1,254 @@
+# log_store.py
+# Append-only JSON Lines store for the sniffer's leak log: one record per
+# line, so adding a detection costs one write instead of re-serializing the
+# whole session.
+import hashlib
+import json
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+LOG_FILE = "sdk_logs.jsonl"
+LEGACY_LOG_FILE = "sdk_logs.json"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+HEAD_BYTES = 4096
+
+
+def format_timestamp(epoch):
+    return datetime.fromtimestamp(epoch).strftime(TIMESTAMP_FORMAT)
+
+
+def parse_timestamp(text):
+    # "Timestamp" (local time) -> epoch seconds, or None
+    try:
+        return int(datetime.strptime(text, TIMESTAMP_FORMAT).timestamp())
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def normalize_record(record, default_epoch):
+    """Give `record` an integer "Epoch" and a "Timestamp" if it lacks them.
+
+    The epoch comes from the record's Timestamp when it has one, otherwise
+    from `default_epoch`. Returns the record's epoch.
+    """
+    epoch = record.get("Epoch")
+    if type(epoch) is not int or not -2**53 < epoch < 2**53:
+        epoch = parse_timestamp(record.get("Timestamp"))
+        if epoch is None:
+            epoch = int(default_epoch)
+        record["Epoch"] = epoch
+    if "Timestamp" not in record:
+        record["Timestamp"] = format_timestamp(epoch)
+    return epoch
+
+
+class LogWriter:
+    def __init__(self, path=LOG_FILE, fsync_interval=5.0, buffering=64 * 1024):
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self._file = open(path, "a", encoding="utf-8", buffering=buffering)
+        self._last_sync = time.monotonic()
+
+    def append(self, record):
+        self.append_many([record])
+
+    def append_many(self, records):
+        self._file.write("".join(json.dumps(r) + "\n" for r in records))
+        # Flush every batch so the dashboard sees it; fsync only periodically.
+        self._file.flush()
+        if time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._last_sync = time.monotonic()
+
+    def truncate(self):
+        self._file.flush()
+        self._file.seek(0)
+        self._file.truncate()
+        self.sync()
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+
+_TRUNCATE = object()
+_STOP = object()
+
+
+class BackgroundLogWriter:
+    """Moves LogWriter I/O off the caller's thread.
+
+    Records go through a bounded queue to a writer thread that appends them
+    in batches of up to `batch_size`, or whatever arrived within
+    `flush_interval` seconds. When the queue is full, submit() waits up to
+    `block_timeout` seconds and then drops the record. Both cases are
+    counted.
+    """
+
+    def __init__(self, writer, max_queue=10_000, batch_size=256, flush_interval=0.5, block_timeout=0.0):
+        self.writer = writer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.written = 0
+        self.dropped = 0
+        self.backpressured = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name="sdk-log-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, record):
+        try:
+            self.queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.backpressured += 1
+        if self.block_timeout > 0:
+            try:
+                self.queue.put(record, timeout=self.block_timeout)
+                return True
+            except queue.Full:
+                pass
+        self.dropped += 1
+        return False
+
+    def truncate(self):
+        self.queue.put(_TRUNCATE)
+
+    def wait(self):
+        self.queue.join()
+
+    def close(self):
+        if self._thread.is_alive():
+            self.queue.put(_STOP)
+            self._thread.join()
+        self.writer.close()
+
+    def stats(self):
+        return {
+            "written": self.written,
+            "dropped": self.dropped,
+            "backpressured": self.backpressured,
+            "errors": self.errors,
+            "queued": self.queue.qsize(),
+        }
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            self.writer.append_many(batch)
+            self.written += len(batch)
+        except Exception:
+            self.errors += 1
+
+    def _run(self):
+        while True:
+            batch = []
+            item = self.queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while item is not _TRUNCATE and item is not _STOP:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    item = None
+                    break
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    item = None
+                    break
+            self._write(batch)
+            if item is _TRUNCATE:
+                try:
+                    self.writer.truncate()
+                except Exception:
+                    self.errors += 1
+            for _ in range(len(batch) + (item is not None)):
+                self.queue.task_done()
+            if item is _STOP:
+                return
+
+
+def head_digest(f, size):
+    # fingerprint of a log's first bytes, to tell a log truncated and
+    # written again past the old offset from one that only grew
+    f.seek(0)
+    return hashlib.sha1(f.read(min(size, HEAD_BYTES))).hexdigest()
+
+
+def iter_records(path=LOG_FILE):
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                # the writer has not finished this record yet
+                break
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+# the dashboard's LogCache, RiskCounters and export may all migrate at once
+_migrate_lock = threading.Lock()
+
+
+def migrate_legacy_log(src=LEGACY_LOG_FILE, dst=LOG_FILE, force=False):
+    with _migrate_lock:
+        if not os.path.exists(src) or (os.path.exists(dst) and not force):
+            return 0
+        try:
+            with open(src, "r", encoding="utf-8") as f:
+                records = json.load(f)
+        except ValueError:
+            return 0
+        if not isinstance(records, list):
+            return 0
+        # Records without a Timestamp get the one of the record before them,
+        # or the legacy file's modification time, once and for all.
+        epoch = int(os.path.getmtime(src))
+        fd, tmp = tempfile.mkstemp(prefix=os.path.basename(dst) + ".", suffix=".tmp",
+                                   dir=os.path.dirname(os.path.abspath(dst)))
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                for record in records:
+                    if isinstance(record, dict):
+                        epoch = normalize_record(record, epoch)
+                    f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            # mkstemp creates the file private; give it the legacy log's mode
+            os.chmod(tmp, os.stat(src).st_mode & 0o777)
+            os.replace(tmp, dst)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        return len(records)
+
+
+if __name__ == "__main__":
+    # python log_store.py migrate [sdk_logs.json] [sdk_logs.jsonl]
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        sys.exit("usage: python log_store.py migrate [src.json] [dst.jsonl]")
+    src = sys.argv[2] if len(sys.argv) > 2 else LEGACY_LOG_FILE
+    dst = sys.argv[3] if len(sys.argv) > 3 else LOG_FILE
+    count = migrate_legacy_log(src, dst, force=True)
+    print(f"Migrated {count} records from {src} to {dst}")
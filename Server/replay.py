@@ -0,0 +1,138 @@
+# replay.py
+# Runs the sniffer's PII detection offline over saved traffic: a mitmproxy
+# .flow dump (mitmdump -w) or a HAR file. Requests are scanned in a pool of
+# worker processes and written to a log in the same format as the live
+# sniffer, in capture order. HAR files are streamed entry by entry.
+#
+#   python replay.py capture.flow [more.har ...] [-o sdk_logs.jsonl] [-j N] [--har-out leaks.har]
+import argparse
+import collections
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from mitmproxy import exceptions, http, io
+
+import card_check
+import har_stream
+import sdk_sniffer
+import sniffer_worker
+from dedup import POLICIES as DEDUP_POLICIES, Deduplicator
+from log_store import LOG_FILE, LogWriter
+from schema_cache import SchemaCache
+
+
+def _iter_flow_requests(path):
+    with open(path, "rb") as f:
+        for flow in io.FlowReader(f).stream():
+            if isinstance(flow, http.HTTPFlow):
+                yield flow.request
+
+
+def _iter_har_requests(path):
+    for entry in har_stream.iter_har_entries(path):
+        try:
+            yield har_stream.entry_to_request(entry)
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Skipping malformed HAR entry: {e!r}", file=sys.stderr)
+
+
+def iter_requests(paths):
+    # (domain, url, timestamp, request state) for every HTTP request
+    for path in paths:
+        reader = _iter_har_requests if har_stream.is_har(path) else _iter_flow_requests
+        for req in reader(path):
+            yield req.host, req.pretty_url, int(req.timestamp_start), req.get_state()
+
+
+def scan_all(requests, settings, workers, window):
+    """Yield (domain, url, timestamp, state, data_sent) in input order."""
+    if workers <= 1:
+        sniffer_worker.init_worker(settings)
+        for domain, url, timestamp, state in requests:
+            data_sent, _ = sniffer_worker.scan_request_state(state)
+            yield domain, url, timestamp, state, data_sent
+        return
+
+    pending = collections.deque()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=sniffer_worker.init_worker,
+        initargs=(settings,),
+    ) as pool:
+        for domain, url, timestamp, state in requests:
+            # bounded read-ahead, so a large dump is never loaded whole
+            future = pool.submit(sniffer_worker.scan_request_state, state)
+            pending.append((domain, url, timestamp, state, future))
+            if len(pending) >= window:
+                domain, url, timestamp, state, future = pending.popleft()
+                yield domain, url, timestamp, state, future.result()[0]
+        while pending:
+            domain, url, timestamp, state, future = pending.popleft()
+            yield domain, url, timestamp, state, future.result()[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run SDKSniffer PII detection over saved .flow or HAR files.")
+    parser.add_argument("paths", nargs="+", help=".flow dumps or HAR files, read in the order given")
+    parser.add_argument("-o", "--output", default=LOG_FILE, help=f"log to write (default {LOG_FILE})")
+    parser.add_argument("--append", action="store_true", help="append to the log instead of replacing it")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: all cores, 1 scans in this process)")
+    parser.add_argument("--max-body-size", type=int, default=64 * 1024 * 1024,
+                        help="decompressed bytes of a body scanned at most")
+    parser.add_argument("--schema-cache", action="store_true", help="scan known payload schemas partially")
+    parser.add_argument("--card-ranges", default=card_check.CARD_RANGES_FILE, help="card brand prefix file")
+    parser.add_argument("--dedup-policy", choices=DEDUP_POLICIES, default="exact")
+    parser.add_argument("--dedup-window", type=int, default=100_000)
+    parser.add_argument("--har-out", help="also write every request with PII to this HAR file")
+    args = parser.parse_args(argv)
+
+    settings = {
+        "max_body_size": args.max_body_size,
+        "schema_cache": SchemaCache() if args.schema_cache else None,
+        "card_trie": card_check.CardPrefixTrie.from_file(args.card_ranges),
+    }
+    dedup = Deduplicator(window=args.dedup_window, policy=args.dedup_policy)
+    writer = LogWriter(args.output)
+    if not args.append:
+        writer.truncate()
+    har_out = har_stream.HarWriter(args.har_out) if args.har_out else None
+
+    scanned = written = 0
+    batch = []
+    try:
+        requests = iter_requests(args.paths)
+        for domain, url, timestamp, state, data_sent in scan_all(requests, settings, args.workers, args.workers * 16):
+            scanned += 1
+            if not data_sent:
+                continue
+            if har_out is not None:
+                # every leaking request, duplicates included
+                har_out.add(har_stream.request_to_entry(http.Request.from_state(state), data_sent))
+            record = sdk_sniffer.make_record(domain, url, timestamp, data_sent)
+            if dedup.seen(domain, record["Data Sent"]):
+                continue
+            batch.append(record)
+            if len(batch) >= 256:
+                writer.append_many(batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            writer.append_many(batch)
+            written += len(batch)
+    except exceptions.FlowReadException as e:
+        sys.exit(f"Cannot read flows: {e}")
+    finally:
+        writer.close()
+        if har_out is not None:
+            har_out.close()
+    print(f"Scanned {scanned} requests, wrote {written} records to {args.output}")
+    if har_out is not None:
+        print(f"Wrote {har_out.count} requests with PII to {args.har_out}")
+
+
+if __name__ == "__main__":
+    main()
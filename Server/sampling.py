@@ -0,0 +1,114 @@
+# sampling.py
+# Per-host sampling for the sniffer. Heartbeat and telemetry endpoints send
+# the same request hundreds of times a minute; a policy decides which of
+# them are worth a full PII scan.
+import re
+import zlib
+from collections import Counter, OrderedDict
+
+_JSON_KEY_RE = re.compile(rb'"([^"\\]{1,64})"\s*:')
+_FORM_KEY_RE = re.compile(rb'(?:^|&)([^=&]{1,64})=')
+SHAPE_PREFIX_BYTES = 64 * 1024
+SHAPES_PER_HOST = 256
+
+
+class SamplingPolicy:
+    """Scan the first `first` requests of a host, then one in `every`.
+
+    every=0 disables the periodic scan. With `on_shape_change`, a request
+    whose body shape has not been seen for the host is always scanned.
+    """
+
+    def __init__(self, first=0, every=1, on_shape_change=False):
+        self.first = first
+        self.every = every
+        self.on_shape_change = on_shape_change
+
+    @classmethod
+    def parse(cls, spec):
+        # "first:every" or "first:every:shape"
+        parts = spec.split(":")
+        if len(parts) not in (2, 3) or (len(parts) == 3 and parts[2] != "shape"):
+            raise ValueError(f"Invalid sampling policy {spec!r}, expected first:every[:shape]")
+        return cls(int(parts[0]), int(parts[1]), len(parts) == 3)
+
+
+def body_shape(req):
+    # Cheap structural fingerprint: method, path, query keys, content type
+    # and the key names in the start of the body. Values are ignored.
+    raw = req.raw_content or b""
+    parts = [req.method.encode(), req.path.split("?", 1)[0].encode()]
+    parts.extend(sorted(k.encode() for k in req.query.keys()))
+    parts.append(req.headers.get("content-type", "").encode())
+    if req.headers.get("content-encoding", ""):
+        # compressed bytes say nothing about keys; use the size class
+        parts.append(str(len(raw).bit_length()).encode())
+    else:
+        head = raw[:SHAPE_PREFIX_BYTES]
+        keys = set(_JSON_KEY_RE.findall(head)) or set(_FORM_KEY_RE.findall(head))
+        parts.extend(sorted(keys))
+    return zlib.crc32(b"\0".join(parts))
+
+
+class FlowSampler:
+    def __init__(self, default=None, overrides=None):
+        self.default = default or SamplingPolicy()
+        self.exact = {}
+        self.suffixes = []
+        for pattern, policy in (overrides or {}).items():
+            if pattern.startswith("*."):
+                self.suffixes.append((pattern[1:], policy))
+            else:
+                self.exact[pattern] = policy
+        self.shapes = {}
+        self.stats = Counter()
+        self.skipped_by_host = Counter()
+
+    @classmethod
+    def from_specs(cls, default, specs):
+        # specs: "host=first:every[:shape]", host may be "*.example.com"
+        overrides = {}
+        for spec in specs:
+            host, sep, policy = spec.partition("=")
+            if not sep:
+                raise ValueError(f"Invalid sampling override {spec!r}, expected host=first:every[:shape]")
+            overrides[host.strip().lower()] = SamplingPolicy.parse(policy.strip())
+        return cls(default, overrides)
+
+    def policy_for(self, host):
+        host = host.lower()
+        if host in self.exact:
+            return self.exact[host]
+        for suffix, policy in self.suffixes:
+            if host.endswith(suffix):
+                return policy
+        return self.default
+
+    def should_scan(self, host, seen, req):
+        """`seen` is the 1-based count of requests to `host` so far."""
+        policy = self.policy_for(host)
+        new_shape = policy.on_shape_change and self._new_shape(host, body_shape(req))
+        if seen <= policy.first:
+            return self._decide(host, "scanned_first")
+        if new_shape:
+            return self._decide(host, "scanned_shape_change")
+        if policy.every > 0 and (seen - policy.first) % policy.every == 0:
+            return self._decide(host, "scanned_sampled")
+        return self._decide(host, "skipped")
+
+    def _new_shape(self, host, shape):
+        known = self.shapes.setdefault(host, OrderedDict())
+        if shape in known:
+            known.move_to_end(shape)
+            return False
+        known[shape] = None
+        if len(known) > SHAPES_PER_HOST:
+            known.popitem(last=False)
+        return True
+
+    def _decide(self, host, outcome):
+        self.stats[outcome] += 1
+        if outcome == "skipped":
+            self.skipped_by_host[host] += 1
+            return False
+        return True
@@ -0,0 +1,43 @@
+# schema_cache.py
+# Remembers, per payload schema, which key paths carried PII. SDK beacons
+# reuse one schema with changing values, so after the first full scan only
+# the sensitive paths need the regexes, with a full rescan now and then to
+# pick up fields that start carrying PII later.
+from collections import OrderedDict
+
+
+class SchemaCache:
+    def __init__(self, rescan_every=100, max_schemas=4096):
+        self.rescan_every = rescan_every
+        self.max_schemas = max_schemas
+        # schema (frozenset of full_key paths) -> [uses, {full_key: pii types}]
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.rescans = 0
+
+    def lookup(self, schema):
+        """Sensitive paths for `schema`, or None when a full scan is due."""
+        entry = self.entries.get(schema)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(schema)
+        entry[0] += 1
+        if self.rescan_every and entry[0] % self.rescan_every == 0:
+            self.rescans += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def store(self, schema, sensitive):
+        entry = self.entries.get(schema)
+        if entry is not None:
+            entry[1] = sensitive
+            return
+        self.entries[schema] = [0, sensitive]
+        if len(self.entries) > self.max_schemas:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        return {"schemas": len(self.entries), "hits": self.hits, "misses": self.misses, "rescans": self.rescans}
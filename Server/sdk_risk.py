@@ -1,9 +1,19 @@
 # sdk_risk.py
+import hashlib
 import json
-import os
 import math
+import os
+import sys
+import threading
+import time
+from array import array
+
+from log_store import HEAD_BYTES, LOG_FILE, head_digest, iter_records, migrate_legacy_log, parse_timestamp
 
-LOG_FILE = "sdk_logs.json"
+try:
+    import numpy as np
+except ImportError:  # per-domain and windowed scores fall back to plain Python
+    np = None
 
 CATEGORY_KEYS = {
     "device_info": {
@@ -46,37 +56,38 @@ CATEGORY_WEIGHTS = {
 }
 
 def load_logs(path=LOG_FILE):
-    if not os.path.exists(path):
-        return []
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except:
-        return []
+    return list(iter_records(path))
+
+# key -> category in one lookup; a key listed twice keeps its first category
+KEY_CATEGORY = {}
+for _cat, _keys in CATEGORY_KEYS.items():
+    for _key in _keys:
+        KEY_CATEGORY.setdefault(_key, _cat)
+
+# (keyword, category) for Data Sent that is not a dict and is searched as text
+KEYWORD_CATEGORIES = tuple((k, cat) for cat, keys in CATEGORY_KEYS.items() for k in sorted(keys))
 
 def classify_key(key):
-    k = key.lower().strip()
-    for cat, keys in CATEGORY_KEYS.items():
-        if k in keys:
-            return cat
-    return None
+    return KEY_CATEGORY.get(key.lower().strip())
+
+def tally_record(entry, counts):
+    data = entry.get("Data Sent", {})
+    if isinstance(data, dict):
+        for key in data:
+            cat = KEY_CATEGORY.get(key.lower().strip())
+            if cat:
+                counts[cat] += 1
+    else:
+        s = str(data).lower()
+        for k, cat in KEYWORD_CATEGORIES:
+            if k in s:
+                counts[cat] += 1  # count every match separately
 
 def tally_categories(logs):
 
     counts = {c: 0 for c in CATEGORY_KEYS.keys()}
     for entry in logs:
-        data = entry.get("Data Sent", {})
-        if isinstance(data, dict):
-            for key, val in data.items():
-                cat = classify_key(key)
-                if cat:
-                    counts[cat] += 1
-        else:
-            s = str(data).lower()
-            for cat, keys in CATEGORY_KEYS.items():
-                for k in keys:
-                    if k in s:
-                        counts[cat] += 1  # count every match separately
+        tally_record(entry, counts)
     return counts
 
 def subscore_log_scale(count, max_count):
@@ -86,8 +97,12 @@ def subscore_log_scale(count, max_count):
     return min(10.0, s)
 
 def compute_risk_from_logs(path=LOG_FILE):
-    logs = load_logs(path)
-    counts = tally_categories(logs)
+    return compute_risk(load_logs(path))
+
+def compute_risk(logs):
+    return score_counts(tally_categories(logs), len(logs))
+
+def score_counts(counts, total_logs):
     max_count = max(counts.values()) if counts else 0
 
     subs = {c: subscore_log_scale(counts[c], max_count) for c in counts}
@@ -108,4 +123,355 @@ def compute_risk_from_logs(path=LOG_FILE):
             "weight": CATEGORY_WEIGHTS.get(c, 0)
         }
 
-    return final_score, details, len(logs)
+    return final_score, details, total_logs
+
+
+def counters_path(log_path=LOG_FILE):
+    return os.path.splitext(log_path)[0] + ".risk.json"
+
+def _categories_digest():
+    # saved counters are only reused while the categories they count are unchanged
+    spec = json.dumps({c: sorted(keys) for c, keys in CATEGORY_KEYS.items()}, sort_keys=True)
+    return hashlib.sha1(spec.encode()).hexdigest()
+
+
+class RiskCounters:
+    """Running category counts of a JSONL leak log.
+
+    refresh() reads only the records appended since the last call and
+    saves the counts, the log offset and a fingerprint of the log's first
+    bytes to `state_path`, so a restarted dashboard resumes where it left
+    off. A truncated or replaced log is counted again from the start.
+    """
+
+    def __init__(self, path=LOG_FILE, state_path=None):
+        self.path = path
+        self.state_path = state_path or counters_path(path)
+        self.lock = threading.Lock()
+        self._migrated = False
+        self._reset(None)
+        self._load()
+
+    def _reset(self, file_id):
+        self.file_id = file_id  # (st_dev, st_ino) of the file counted so far
+        self.offset = 0
+        self.head = ""
+        self.total = 0
+        self.counts = {c: 0 for c in CATEGORY_KEYS}
+
+    def _load(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if state["categories"] != _categories_digest():
+                return
+            counts = {c: int(state["counts"][c]) for c in CATEGORY_KEYS}
+            file_id = tuple(state["file_id"]) if state["file_id"] else None
+            offset, head, total = int(state["offset"]), str(state["head"]), int(state["total"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return
+        self.file_id, self.offset, self.head, self.total, self.counts = file_id, offset, head, total, counts
+
+    def _save(self):
+        state = {
+            "log": os.path.basename(self.path),
+            "file_id": self.file_id,
+            "offset": self.offset,
+            "head": self.head,
+            "total": self.total,
+            "categories": _categories_digest(),
+            "counts": self.counts,
+        }
+        tmp = self.state_path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp, self.state_path)
+        except OSError:
+            pass  # counters are rebuilt from the log if they cannot be saved
+
+    def refresh(self):
+        with self.lock:
+            if not self._migrated:
+                migrate_legacy_log(dst=self.path)
+                self._migrated = True
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                if self.offset:
+                    self._reset(None)
+                    self._save()
+                return self
+            file_id = (st.st_dev, st.st_ino)
+            with open(self.path, "rb") as f:
+                if (file_id != self.file_id or st.st_size < self.offset
+                        or (self.offset and head_digest(f, self.offset) != self.head)):
+                    # replaced (migration, rotation) or truncated (new session)
+                    self._reset(file_id)
+                if st.st_size > self.offset:
+                    self._read_new(f)
+                    self._save()
+        return self
+
+    def _read_new(self, f):
+        f.seek(self.offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                # the writer has not finished this record yet
+                break
+            self.offset += len(line)
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(item, dict):
+                tally_record(item, self.counts)
+                self.total += 1
+        if self.offset < HEAD_BYTES or not self.head:
+            self.head = head_digest(f, self.offset)
+
+    def rebuild(self):
+        """Forget the saved counts and count the whole log again."""
+        with self.lock:
+            self._reset(None)
+        return self.refresh()
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counts), self.total
+
+    def compute_risk(self):
+        # Same result as compute_risk(<all records>), from the counters only
+        return score_counts(*self.refresh().snapshot())
+
+
+def verify_counters(path=LOG_FILE):
+    """Compare the incremental counters with a batch tally of the records
+    they cover. Returns (incremental, batch), each as (counts, total)."""
+    counters = RiskCounters(path).refresh()
+    with counters.lock:
+        incremental = (dict(counters.counts), counters.total)
+        offset = counters.offset
+    logs = []
+    if offset:
+        with open(path, "rb") as f:
+            data = f.read(offset)
+        for line in data.splitlines():
+            try:
+                item = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(item, dict):
+                logs.append(item)
+    return incremental, (tally_categories(logs), len(logs))
+
+
+CATEGORIES = tuple(CATEGORY_KEYS)
+
+# window name -> length in seconds; None is the whole session (the log)
+RISK_WINDOWS = {"5m": 300, "1h": 3600, "session": None}
+
+UNKNOWN_DOMAIN = "(unknown)"
+
+
+def _score_matrix(counts):
+    # score_counts for every row of a (rows x CATEGORIES) count matrix
+    counts = counts.astype(np.float64)
+    max_count = counts.max(axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        subs = np.log(counts + 1) / np.log(max_count + 1) * 10.0
+    subs = np.where((counts > 0) & (max_count > 0), np.minimum(subs, 10.0), 0.0)
+    weights = np.array([CATEGORY_WEIGHTS.get(c, 0) for c in CATEGORIES])
+    final = subs @ weights / sum(CATEGORY_WEIGHTS.values()) * 10.0
+    return np.round(np.clip(final, 0.0, 100.0), 1)
+
+
+class RiskColumns:
+    """Per-domain and per-time-window risk scores of a growing log.
+
+    Records are reduced once, as they arrive, to columns: a domain id and
+    a timestamp per record and (record, category, count) per category hit.
+    scores() then aggregates all domains and windows at once, with NumPy
+    when it is installed.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._clear(None)
+
+    def _clear(self, source):
+        self._source = source
+        self._synced = 0
+        self.domains = []
+        self.domain_ids = {}
+        self.rec_domain = array("i")
+        self.rec_time = array("d")  # epoch seconds, NaN when unknown
+        self.hit_record = array("i")
+        self.hit_category = array("b")
+        self.hit_count = array("i")
+        self._epochs = {}
+        self._key_category = []  # category of each key id of the synced store
+
+    def __len__(self):
+        return len(self.rec_domain)
+
+    def _epoch(self, entry):
+        epoch = entry.get("Epoch")
+        if type(epoch) is int:
+            return float(epoch)
+        # records that did not come through normalize_record
+        timestamp = entry.get("Timestamp")
+        if not isinstance(timestamp, str):
+            return math.nan
+        epoch = self._epochs.get(timestamp)
+        if epoch is None:
+            epoch = parse_timestamp(timestamp)
+            epoch = math.nan if epoch is None else float(epoch)
+            if len(self._epochs) >= 100_000:
+                self._epochs.clear()
+            self._epochs[timestamp] = epoch
+        return epoch
+
+    def extend(self, records):
+        with self.lock:
+            self._extend(records)
+        return self
+
+    def _add(self, domain, epoch, counts):
+        # one record: its domain, epoch and {category: count}
+        domain = UNKNOWN_DOMAIN if domain is None else str(domain)
+        domain_id = self.domain_ids.get(domain)
+        if domain_id is None:
+            domain_id = self.domain_ids[domain] = len(self.domains)
+            self.domains.append(domain)
+        record_id = len(self.rec_domain)
+        self.rec_domain.append(domain_id)
+        self.rec_time.append(epoch)
+        for category_id, cat in enumerate(CATEGORIES):
+            if counts[cat]:
+                self.hit_record.append(record_id)
+                self.hit_category.append(category_id)
+                self.hit_count.append(counts[cat])
+
+    def _extend(self, records):
+        for entry in records:
+            if not isinstance(entry, dict):
+                continue
+            counts = dict.fromkeys(CATEGORIES, 0)
+            tally_record(entry, counts)
+            self._add(entry.get("App Domain"), self._epoch(entry), counts)
+
+    def sync(self, store):
+        """Catch up with `store`, a log_columns.LogColumns that only grows
+        until it is replaced by a new one (LogCache.store). Categories are
+        looked up once per distinct Data Sent key, not per record."""
+        with self.lock:
+            if store is not self._source or len(store) < self._synced:
+                self._clear(store)
+            key_category = self._key_category
+            for record_id in range(self._synced, len(store)):
+                key_ids = store.key_ids(record_id)
+                if key_ids is None:
+                    # not in columns form; counted like any other record
+                    self._extend((store.record(record_id),))
+                    continue
+                counts = dict.fromkeys(CATEGORIES, 0)
+                for key_id in key_ids:
+                    while len(key_category) <= key_id:
+                        key_category.append(classify_key(store.keys[len(key_category)]))
+                    cat = key_category[key_id]
+                    if cat:
+                        counts[cat] += 1
+                self._add(store.domain_name(record_id), float(store.epoch[record_id]), counts)
+            self._synced = len(store)
+        return self
+
+    def scores(self, now=None, windows=None):
+        """{window: {"total": {...}, "domains": [{...}, ...]}} where each
+        entry has "score", "records" and per-category "counts", as
+        compute_risk would give for the records in that window. Domains
+        are listed by descending score."""
+        now = time.time() if now is None else now
+        windows = RISK_WINDOWS if windows is None else windows
+        with self.lock:
+            if np is not None:
+                aggregated = self._aggregate_numpy(now, windows)
+            else:
+                aggregated = self._aggregate_python(now, windows)
+        result = {}
+        for name, (records, counts, scores, total_score) in aggregated.items():
+            domains = [
+                {"domain": self.domains[d], "score": scores[d], "records": records[d],
+                 "counts": dict(zip(CATEGORIES, counts[d]))}
+                for d in range(len(records)) if records[d]
+            ]
+            domains.sort(key=lambda item: (-item["score"], item["domain"]))
+            totals = [sum(row[c] for row in counts) for c in range(len(CATEGORIES))]
+            result[name] = {
+                "total": {"score": total_score, "records": sum(records),
+                          "counts": dict(zip(CATEGORIES, totals))},
+                "domains": domains,
+            }
+        return result
+
+    def _aggregate_numpy(self, now, windows):
+        # window -> (records per domain, counts per domain, score per domain, total score)
+        n_domains, n_categories = len(self.domains), len(CATEGORIES)
+        rec_domain = np.frombuffer(self.rec_domain, dtype=np.intc)
+        rec_time = np.frombuffer(self.rec_time, dtype=np.float64)
+        hit_record = np.frombuffer(self.hit_record, dtype=np.intc)
+        hit_cell = rec_domain[hit_record].astype(np.int64) * n_categories + np.frombuffer(self.hit_category, dtype=np.int8)
+        hit_count = np.frombuffer(self.hit_count, dtype=np.intc)
+        hit_time = rec_time[hit_record]
+        out = {}
+        for name, span in windows.items():
+            if span is None:
+                rec_mask = hit_mask = slice(None)
+            else:
+                # NaN timestamps compare False and only count for the session
+                rec_mask = rec_time >= now - span
+                hit_mask = hit_time >= now - span
+            records = np.bincount(rec_domain[rec_mask], minlength=n_domains)
+            counts = np.bincount(hit_cell[hit_mask], weights=hit_count[hit_mask], minlength=n_domains * n_categories)
+            counts = counts.astype(np.int64).reshape(n_domains, n_categories)
+            scores = _score_matrix(counts) if n_domains else np.zeros(0)
+            total_score = _score_matrix(counts.sum(axis=0, keepdims=True))[0]
+            out[name] = (records.tolist(), counts.tolist(), scores.tolist(), float(total_score))
+        return out
+
+    def _aggregate_python(self, now, windows):
+        n_domains, n_categories = len(self.domains), len(CATEGORIES)
+        out = {}
+        for name, span in windows.items():
+            start = None if span is None else now - span
+            records = [0] * n_domains
+            for domain_id, epoch in zip(self.rec_domain, self.rec_time):
+                if start is None or epoch >= start:
+                    records[domain_id] += 1
+            counts = [[0] * n_categories for _ in range(n_domains)]
+            for record_id, category_id, count in zip(self.hit_record, self.hit_category, self.hit_count):
+                if start is None or self.rec_time[record_id] >= start:
+                    counts[self.rec_domain[record_id]][category_id] += count
+            scores = [score_counts(dict(zip(CATEGORIES, row)), 0)[0] for row in counts]
+            totals = dict(zip(CATEGORIES, (sum(col) for col in zip(*counts)) if counts else [0] * n_categories))
+            out[name] = (records, counts, scores, score_counts(totals, 0)[0])
+        return out
+
+
+if __name__ == "__main__":
+    # python sdk_risk.py rebuild|verify [sdk_logs.jsonl]
+    if len(sys.argv) < 2 or sys.argv[1] not in ("rebuild", "verify"):
+        sys.exit("usage: python sdk_risk.py rebuild|verify [log.jsonl]")
+    path = sys.argv[2] if len(sys.argv) > 2 else LOG_FILE
+    if sys.argv[1] == "rebuild":
+        counters = RiskCounters(path).rebuild()
+        print(f"Counted {counters.total} records of {path} into {counters.state_path}: {counters.counts}")
+    else:
+        incremental, batch = verify_counters(path)
+        if incremental != batch:
+            sys.exit(f"MISMATCH\n incremental: {incremental}\n batch:       {batch}\n"
+                     f"Run python sdk_risk.py rebuild {path} to recount.")
+        print(f"OK: {incremental[1]} records, {incremental[0]}")
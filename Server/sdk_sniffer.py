@@ -1,10 +1,30 @@
-from mitmproxy import http, ctx
+from mitmproxy import command, http, ctx, exceptions
+import functools
 import json
+import multiprocessing
+import os
+import itertools
 import re
-import gzip
-from datetime import datetime
-
-LOG_FILE = "sdk_logs.json"
+import sys
+import threading
+import time
+import typing
+from concurrent.futures import Future, ProcessPoolExecutor
+from log_store import LOG_FILE, BackgroundLogWriter, LogWriter, format_timestamp
+from dedup import POLICIES as DEDUP_POLICIES, Deduplicator
+from json_stream import iter_leaves, walk_leaves
+from body_stream import BodyStream
+from sampling import FlowSampler, SamplingPolicy
+from schema_cache import SchemaCache
+from stage_stats import NULL_TIMER, StageStats
+import card_check
+from card_check import CardBatch, luhn_valid_many
+import sniffer_worker
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
 
 def wrap_keywords(keywords: str, value_regex: str) -> str:
     return rf'(?i)(?:"?\b(?:{keywords})\b"?\s*[:=\- ]*\s*"?({value_regex})"?)'
@@ -77,6 +97,116 @@ patterns = {
     "installer_package": wrap_keywords(r'installer_package', r'[a-zA-Z0-9\._\-]+')
 }
 
+def _required_literals(items):
+    # Returns a set of lowercase literals such that every match of `items`
+    # contains at least one of them, or None when no such set is known.
+    best = None
+    run = ""
+
+    def consider(candidate):
+        nonlocal best
+        if candidate and (best is None or min(map(len, candidate)) > min(map(len, best))):
+            best = candidate
+
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            run += chr(av).lower()
+            continue
+        if op in (sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            # zero-width, the surrounding literals stay adjacent
+            continue
+        consider({run} if run else None)
+        run = ""
+        if op is sre_parse.SUBPATTERN:
+            consider(_required_literals(av[-1]))
+        elif op is sre_parse.BRANCH:
+            alternatives = [_required_literals(alt) for alt in av[1]]
+            if all(alternatives):
+                consider(set().union(*alternatives))
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] >= 1:
+            consider(_required_literals(av[2]))
+    consider({run} if run else None)
+    return best
+
+
+class PIIMatcher:
+    """Precompiled form of a `patterns` table.
+
+    Every keyword alternation is reduced to the literals one of which must
+    appear in the text for the pattern to match. Only the patterns owning a
+    literal present in the text are searched, so the results are identical
+    to searching every pattern.
+
+    No literal contains ":", so the candidates for "key:value" are those of
+    the key plus those of the value. SDKs repeat the same few hundred keys,
+    so the key side is memoized in a bounded LRU cache.
+    """
+
+    def __init__(self, table, key_cache_size=4096):
+        self.compiled = {name: re.compile(regex) for name, regex in table.items()}
+        self.order = {name: i for i, name in enumerate(table)}
+        always = set()
+        anchor_types = {}
+        for name, regex in table.items():
+            anchors = _required_literals(list(sre_parse.parse(regex)))
+            if not anchors or any(":" in a for a in anchors):
+                always.add(name)
+                continue
+            for anchor in anchors:
+                anchor_types.setdefault(anchor, set()).add(name)
+
+        self.always = frozenset(always)
+        self.everything = frozenset(self.compiled)
+        self.anchor_types = sorted(anchor_types.items())
+        # text without letters holds no literal if every literal has one
+        self.cased_anchors = all(anchor.lower() != anchor.upper() for anchor in anchor_types)
+        self.key_candidates = functools.lru_cache(maxsize=key_cache_size)(self.scan)
+
+    def scan(self, text):
+        if not text.isascii():
+            # str.lower() only agrees with re.IGNORECASE on ASCII text
+            return self.everything
+        lowered = text.lower()
+        if self.cased_anchors and lowered == text.upper():
+            return self.always
+        found = set(self.always)
+        for anchor, types in self.anchor_types:
+            if anchor in lowered:
+                found |= types
+        return frozenset(found)
+
+    def candidates(self, key, val_str):
+        return self.key_candidates(key) | self.scan(val_str)
+
+    def search_all(self, key, val_str, stats=None):
+        # `stats`, a StageStats, gets the time spent in each pattern.
+        candidates = self.candidates(key, val_str)
+        if not candidates:
+            return []
+        text = f"{key}:{val_str}"
+        matches = []
+        for name in sorted(candidates, key=self.order.__getitem__):
+            if stats is None:
+                match = self.compiled[name].search(text)
+            else:
+                start = time.perf_counter()
+                match = self.compiled[name].search(text)
+                stats.add(f"pattern:{name}", time.perf_counter() - start)
+            if match:
+                matches.append((name, match))
+        return matches
+
+
+pii_matcher = PIIMatcher(patterns)
+
+IMEI_KEY_RE = re.compile(r'(?i)\b(imei|imeei|imeid|imei[_\-\.]?(md5|sha1|hash))\b')
+IMEI_RE = re.compile(r'\b\d{15}\b')
+CC_CANDIDATE_RE = re.compile(r'(?<!\.)\b\d{13,19}\b(?!\.\d)')
+
+# Bodies above this size are walked with json_stream instead of json.loads.
+LARGE_BODY_CHARS = 1_000_000
+JSON_START_RE = re.compile(r'\s*[\[{]')
+
 JUNK_WORDS = {
     "whatsapp", "name" , "offer", "no offer", "add to cart", "cart", "button",
     "screen", "page", "activity", "fragment", "event", "register",
@@ -89,110 +219,385 @@ ALLOWED_NAME_KEYS = {
     "user_name", "account_name", "profile_name", "customer_name", "full_name", "name"
 }
 
-def check_luhn(number: str) -> bool:
-    n_digits = len(number)
-    n_sum = 0
-    is_second = False
-    for i in range(n_digits - 1, -1, -1):
-        d = ord(number[i]) - ord('0')
-        if is_second:
-            d *= 2
-        n_sum += d // 10
-        n_sum += d % 10
-        is_second = not is_second
-    return n_sum % 10 == 0
-
-def get_card_type(card_number):
-    card_types = {
-        "Visa": r"(?<!\.)\b4[0-9]{12}(?:[0-9]{3})?\b(?!\.)",
-        "MasterCard": r"(?<!\.)\b5[1-5][0-9]{14}\b(?!\.)",
-        "American Express": r"(?<!\.)\b3[47][0-9]{13}\b(?!\.)",
-        "Discover": r"(?<!\.)\b6(?:011|5[0-9]{2})[0-9]{12}\b(?!\.)",
-        "JCB": r"(?<!\.)\b(?:2131|1800|35\d{3})\d{11}\b(?!\.)",
-        "Diners Club": r"(?<!\.)\b3(?:0[0-5]|[68][0-9])[0-9]{11}\b(?!\.)",
-        "Maestro": r"(?<!\.)\b(5018|5020|5038|56|57|58|6304|6759|676[1-3])\d{8,15}\b(?!\.)",
-        "Verve": r"(?<!\.)\b(506[01]|507[89]|6500)\d{12,15}\b(?!\.)"
-    }
-    for card_type, pattern in card_types.items():
-        if re.match(pattern, card_number):
-            return card_type
-    return "Unknown"
-
 def detect_imei_from_keyval(key, val_str):
-    imei_regex = r'\b\d{15}\b'
-    key_match = re.search(r'(?i)\b(imei|imeei|imeid|imei[_\-\.]?(md5|sha1|hash))\b', key)
+    key_match = IMEI_KEY_RE.search(key)
     valid = set()
     invalid = set()
     if key_match:
-        candidates = re.findall(imei_regex, val_str)
-        for num in candidates:
-            if check_luhn(num):
+        candidates = IMEI_RE.findall(val_str)
+        for num, ok in zip(candidates, luhn_valid_many(candidates)):
+            if ok:
                 valid.add(num)
             else:
                 invalid.add(num)
     return valid, invalid
 
+def make_record(domain, url, timestamp, data_sent):
+    # One line of sdk_logs.jsonl; `timestamp` is in epoch seconds.
+    return {
+        "App Domain": domain,
+        "Timestamp": format_timestamp(timestamp),
+        "Epoch": timestamp,
+        "Data Sent": {k: sorted(list(v)) for k, v in data_sent.items()},
+        "Request URL": url
+    }
+
 class SDKSniffer:
+    # options that are baked into the worker processes when the pool starts
+    WORKER_OPTIONS = (
+        "sniffer_workers", "sniffer_max_body_size", "sniffer_schema_cache", "sniffer_schema_rescan",
+        "sniffer_card_ranges", "sniffer_stats",
+    )
+
     def __init__(self):
-        self.sdk_data = []
+        self.dedup = Deduplicator()
         self.domain_counter = {}
+        self.sampler = FlowSampler()
+        self.log_writer = None
+        self.max_body_size = 64 * 1024 * 1024
+        self.schema_cache = None
+        self.card_trie = card_check.card_trie
+        self.stats = None
+        self.pool = None
+        self.scan_lock = threading.Lock()
+        self.scans_submitted = 0
+        self.scans_emitted = 0
+        self.scans_done = {}
 
     def load(self, loader):
+        loader.add_option(
+            "sniffer_dedup_policy", str, "exact",
+            "Duplicate suppression: 'exact' keeps only the recent window, "
+            "'bloom' also remembers evicted records in a Bloom filter.",
+            choices=DEDUP_POLICIES,
+        )
+        loader.add_option(
+            "sniffer_dedup_window", int, 100_000,
+            "Number of recent (domain, data) fingerprints kept for exact duplicate checks.",
+        )
+        loader.add_option(
+            "sniffer_dedup_bloom_capacity", int, 10_000_000,
+            "Records the Bloom filter is sized for under the 'bloom' policy.",
+        )
+        loader.add_option(
+            "sniffer_log_queue", int, 10_000,
+            "Maximum number of records waiting for the log writer thread.",
+        )
+        loader.add_option(
+            "sniffer_log_batch", int, 256,
+            "Records the log writer appends per write.",
+        )
+        loader.add_option(
+            "sniffer_log_flush_interval", float, 0.5,
+            "Seconds the log writer waits to fill a batch before writing it.",
+        )
+        loader.add_option(
+            "sniffer_log_block_timeout", float, 0.0,
+            "Seconds a request may wait for room in a full log queue before its record is dropped.",
+        )
+        loader.add_option(
+            "sniffer_max_body_size", int, 64 * 1024 * 1024,
+            "Decompressed bytes of a request body scanned at most; the rest is skipped.",
+        )
+        loader.add_option(
+            "sniffer_sample_first", int, 0,
+            "Requests per host that are always scanned before sampling starts.",
+        )
+        loader.add_option(
+            "sniffer_sample_every", int, 1,
+            "After the first requests of a host, scan one in this many (0: none, 1: all).",
+        )
+        loader.add_option(
+            "sniffer_sample_shape", bool, False,
+            "Always scan a request whose body shape (keys, not values) is new for its host.",
+        )
+        loader.add_option(
+            "sniffer_sample_domains", typing.Sequence[str], [],
+            "Per-host sampling overrides as host=first:every[:shape], host may be *.example.com.",
+        )
+        loader.add_option(
+            "sniffer_schema_cache", bool, False,
+            "Remember which key paths of each payload schema carry PII and scan only those.",
+        )
+        loader.add_option(
+            "sniffer_schema_rescan", int, 100,
+            "Fully rescan a cached schema every this many payloads to catch new sensitive fields.",
+        )
+        loader.add_option(
+            "sniffer_card_ranges", str, "",
+            "JSON file of card brand prefix ranges; empty uses the bundled card_ranges.json.",
+        )
+        loader.add_option(
+            "sniffer_workers", int, 0,
+            "Run PII detection in a pool of this many worker processes; 0 scans inside the proxy.",
+        )
+        loader.add_option(
+            "sniffer_pool_max_pending", int, 1000,
+            "Requests allowed to wait for a worker before the proxy scans them itself.",
+        )
+        loader.add_option(
+            "sniffer_stats", bool, False,
+            "Record timing histograms per pipeline stage and per PII pattern.",
+        )
+        loader.add_option(
+            "sniffer_stats_file", str, "sniffer_stats.json",
+            "File the timing histograms are written to on exit or by the sniffer.stats command.",
+        )
         self.clear_log()
 
+    def configure(self, updated):
+        if "sniffer_stats" in updated:
+            self.stats = StageStats() if ctx.options.sniffer_stats else None
+        if "sniffer_schema_cache" in updated or "sniffer_schema_rescan" in updated:
+            self.schema_cache = self.make_schema_cache()
+        if any(name.startswith("sniffer_sample_") for name in updated):
+            default = SamplingPolicy(
+                ctx.options.sniffer_sample_first,
+                ctx.options.sniffer_sample_every,
+                ctx.options.sniffer_sample_shape,
+            )
+            try:
+                self.sampler = FlowSampler.from_specs(default, ctx.options.sniffer_sample_domains)
+            except ValueError as e:
+                raise exceptions.OptionsError(str(e))
+        if "sniffer_card_ranges" in updated:
+            try:
+                self.card_trie = card_check.CardPrefixTrie.from_file(
+                    ctx.options.sniffer_card_ranges or card_check.CARD_RANGES_FILE
+                )
+            except (OSError, KeyError, TypeError, ValueError) as e:
+                raise exceptions.OptionsError(f"Cannot load card ranges: {e!r}")
+        if "sniffer_max_body_size" in updated:
+            self.max_body_size = ctx.options.sniffer_max_body_size
+        if any(name.startswith("sniffer_dedup_") for name in updated):
+            self.dedup = self.make_dedup()
+        if self.log_writer is not None and any(name.startswith("sniffer_log_") for name in updated):
+            # the next record opens a writer with the new settings
+            self.close_log()
+        if self.pool is not None and any(name in updated for name in self.WORKER_OPTIONS):
+            self.close_pool()
+
+    def make_dedup(self):
+        return Deduplicator(
+            window=ctx.options.sniffer_dedup_window,
+            policy=ctx.options.sniffer_dedup_policy,
+            bloom_capacity=ctx.options.sniffer_dedup_bloom_capacity,
+        )
+
     def done(self):
+        self.close_pool()
+        if self.sampler.stats:
+            summary = ", ".join(f"{n} {outcome}" for outcome, n in sorted(self.sampler.stats.items()))
+            ctx.log.info(f"Sampling: {summary}")
+            noisy = ", ".join(f"{host} ({n})" for host, n in self.sampler.skipped_by_host.most_common(5))
+            if noisy:
+                ctx.log.info(f"Most skipped hosts: {noisy}")
+        if self.schema_cache is not None:
+            ctx.log.info(f"Schema cache: {self.schema_cache.stats()}")
+        if self.stats is not None:
+            self.dump_stats()
         self.clear_log()
+        self.close_log()
+
+    def timed(self, stage):
+        return self.stats.time(stage) if self.stats is not None else NULL_TIMER
+
+    @command.command("sniffer.stats")
+    def show_stats(self) -> None:
+        """Log the slowest stages and patterns and write the stats file."""
+        if self.stats is None:
+            ctx.log.warn("Timing stats are off, enable them with --set sniffer_stats=true")
+            return
+        self.dump_stats()
+
+    def dump_stats(self):
+        ctx.log.info(f"Timing stats:\n{self.stats.format()}")
+        try:
+            self.stats.dump(ctx.options.sniffer_stats_file)
+            ctx.log.info(f"Timing stats written to {ctx.options.sniffer_stats_file}")
+        except OSError as e:
+            ctx.log.warn(f"Failed to write timing stats: {e}")
+
+    def open_pool(self):
+        if self.pool is None and ctx.options.sniffer_workers > 0:
+            # Workers import this module by name, which needs its directory
+            # on sys.path after mitmproxy has finished loading the script.
+            here = os.path.dirname(os.path.abspath(__file__))
+            if here not in sys.path:
+                sys.path.append(here)
+            self.pool = ProcessPoolExecutor(
+                max_workers=ctx.options.sniffer_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=sniffer_worker.init_worker,
+                initargs=(self.worker_settings(),),
+            )
+        return self.pool
+
+    def make_schema_cache(self):
+        if not ctx.options.sniffer_schema_cache:
+            return None
+        return SchemaCache(rescan_every=ctx.options.sniffer_schema_rescan)
+
+    def worker_settings(self):
+        # Workers have no ctx.options; they copy these attributes instead.
+        return {
+            "max_body_size": self.max_body_size,
+            "schema_cache": self.make_schema_cache(),
+            "card_trie": self.card_trie,
+            "stats": StageStats() if self.stats is not None else None,
+        }
+
+    def close_pool(self):
+        if self.pool is not None:
+            # waits for every submitted scan, so all their records are emitted
+            self.pool.shutdown(wait=True)
+            self.pool = None
+
+    def enqueue_scan(self, domain, url, timestamp, future):
+        with self.scan_lock:
+            seq = self.scans_submitted
+            self.scans_submitted += 1
+        future.add_done_callback(lambda f: self.finish_scan(seq, domain, url, timestamp, f))
+
+    def finish_scan(self, seq, domain, url, timestamp, future):
+        # Runs on the pool's callback thread. Results are emitted in
+        # submission order so the log keeps the order requests arrived in.
+        with self.scan_lock:
+            self.scans_done[seq] = (domain, url, timestamp, future)
+            while self.scans_emitted in self.scans_done:
+                domain, url, timestamp, future = self.scans_done.pop(self.scans_emitted)
+                self.scans_emitted += 1
+                try:
+                    data_sent, histograms = future.result()
+                except Exception as e:
+                    ctx.log.warn(f"Scan worker failed for {url}: {e}")
+                    continue
+                if histograms and self.stats is not None:
+                    self.stats.merge(histograms)
+                self.record(domain, url, timestamp, data_sent)
+
+    def open_log(self):
+        if self.log_writer is None:
+            self.log_writer = BackgroundLogWriter(
+                LogWriter(LOG_FILE),
+                max_queue=ctx.options.sniffer_log_queue,
+                batch_size=ctx.options.sniffer_log_batch,
+                flush_interval=ctx.options.sniffer_log_flush_interval,
+                block_timeout=ctx.options.sniffer_log_block_timeout,
+            )
+        return self.log_writer
+
+    def close_log(self):
+        if self.log_writer is None:
+            return
+        self.log_writer.close()
+        stats = self.log_writer.stats()
+        ctx.log.info(
+            f"Log writer drained: {stats['written']} written, {stats['dropped']} dropped, "
+            f"{stats['backpressured']} backpressured, {stats['errors']} errors"
+        )
+        self.log_writer = None
+
+    def flush_log(self):
+        if self.log_writer is not None:
+            self.log_writer.wait()
 
     def clear_log(self):
         try:
-            with open(LOG_FILE, "w") as f:
-                json.dump([], f)
-            self.sdk_data = []
+            self.open_log().truncate()
+            self.dedup = self.make_dedup()
             ctx.log.info("Cleared SDK logs.")
         except Exception as e:
             ctx.log.warn(f"Failed to clear log: {e}")
 
     def request(self, flow: http.HTTPFlow):
+        with self.timed("request"):
+            self.handle_request(flow)
+
+    def handle_request(self, flow: http.HTTPFlow):
         domain = flow.request.host
         self.domain_counter[domain] = self.domain_counter.get(domain, 0) + 1
         ctx.log.info(f"[REQ] {flow.request.method} {flow.request.pretty_url}")
 
+        with self.timed("sample"):
+            scan = self.sampler.should_scan(domain, self.domain_counter[domain], flow.request)
+        if not scan:
+            ctx.log.info("Skipped by sampling policy")
+            return
+
+        url = flow.request.pretty_url
+        timestamp = int(time.time())
+        pool = self.open_pool()
+        if pool is None:
+            self.record(domain, url, timestamp, self.scan_request(flow.request))
+            return
+
+        if self.scans_submitted - self.scans_emitted < ctx.options.sniffer_pool_max_pending:
+            with self.timed("submit"):
+                future = pool.submit(sniffer_worker.scan_request_state, flow.request.get_state())
+        else:
+            # The workers are too far behind; scanning here slows the proxy
+            # down the same way the inline mode would.
+            future = Future()
+            future.set_result((self.scan_request(flow.request), None))
+        self.enqueue_scan(domain, url, timestamp, future)
+
+    def scan_request(self, req: http.Request):
         data_sent = {}
 
 
-        if flow.request.query:
+        if req.query:
             try:
-                query_dict = dict(flow.request.query)
+                query_dict = dict(req.query)
                 ctx.log.info(f"Parsing query params: {list(query_dict.keys())}")
-                data_sent.update(self.detect_pii(query_dict))
+                data_sent.update(self.detect_pii_cached(query_dict))
             except Exception as e:
                 ctx.log.warn(f"Query parse error: {e}")
 
 
+        # Decode incrementally: only the first LARGE_BODY_CHARS are joined
+        # into body_text, larger bodies continue from body_chunks.
+        content_encoding = req.headers.get("content-encoding", "").lower()
+        body = BodyStream(req.raw_content, content_encoding, self.max_body_size)
+        body_chunks = iter(())
         try:
-            raw_bytes = flow.request.get_content()
-            content_encoding = flow.request.headers.get("content-encoding", "").lower()
-            if "gzip" in content_encoding and raw_bytes[:2] == b'\x1f\x8b':
-                body_text = gzip.decompress(raw_bytes).decode("utf-8", errors="replace")
-                ctx.log.info("Decompressed GZIP body")
-            else:
-                body_text = raw_bytes.decode("utf-8", errors="replace")
+            with self.timed("decode"):
+                body_chunks = iter(body)
+                head = []
+                size = 0
+                for chunk in body_chunks:
+                    head.append(chunk)
+                    size += len(chunk)
+                    if size > LARGE_BODY_CHARS:
+                        break
+                body_text = "".join(head)
+            if content_encoding and content_encoding != "identity":
+                ctx.log.info(f"Decoded {content_encoding} body")
         except Exception as e:
             ctx.log.warn(f"Body decode error: {e}")
             body_text = ""
 
-        content_type = flow.request.headers.get("content-type", "").lower()
+        content_type = req.headers.get("content-type", "").lower()
 
 
         is_graphql = False
-        url = flow.request.pretty_url.lower()
+        url = req.pretty_url.lower()
         if "/graphql" in url or url.endswith(".graphql.json") or "graphql" in content_type:
             is_graphql = True
 
+        if is_graphql and len(body_text) > LARGE_BODY_CHARS:
+            # the query and variables are parsed whole, up to max_body_size
+            try:
+                with self.timed("decode"):
+                    body_text += "".join(body_chunks)
+            except Exception as e:
+                ctx.log.warn(f"Body decode error: {e}")
+
         if is_graphql and body_text.strip():
             ctx.log.info("GraphQL request detected, attempting to parse JSON wrapper")
             try:
-                parsed = json.loads(body_text)
+                with self.timed("parse"):
+                    parsed = json.loads(body_text)
 
                 variables = parsed.get("variables", {})
                 query_text = parsed.get("query", "")
@@ -203,7 +608,8 @@ class SDKSniffer:
 
                 if query_text:
 
-                    literals = re.findall(r'\"([^"]{2,200})\"', query_text)
+                    with self.timed("graphql_literals"):
+                        literals = re.findall(r'\"([^"]{2,200})\"', query_text)
                     if literals:
                         ctx.log.info(f"Found {len(literals)} literals in GraphQL query, scanning them")
                         # turn into a simple dict to pass to detect_pii
@@ -216,33 +622,40 @@ class SDKSniffer:
                 data_sent.update(self.detect_pii({"raw_body": body_text}))
 
 
-        elif flow.request.method in ("POST", "PUT") and body_text.strip():
+        elif req.method in ("POST", "PUT") and body_text.strip():
             try:
-                if len(body_text) > 1_000_000:
-                    ctx.log.info("Large body, scanning truncated")
-                    data_sent.update(self.detect_pii({"raw_body": body_text[:1000]}))
+                if len(body_text) > LARGE_BODY_CHARS:
+                    if JSON_START_RE.match(body_text):
+                        ctx.log.info("Large JSON body, scanning incrementally")
+                        data_sent.update(self.detect_pii_stream(itertools.chain([body_text], body_chunks)))
+                    else:
+                        ctx.log.info("Large body, scanning truncated")
+                        data_sent.update(self.detect_pii({"raw_body": body_text[:1000]}))
                 else:
                     parsed_body = None
                     try:
-                        parsed_body = json.loads(body_text)
+                        with self.timed("parse"):
+                            parsed_body = json.loads(body_text)
                         ctx.log.info("Parsed body as JSON")
                     except Exception:
                         parsed_body = None
 
                     if parsed_body is not None:
-                        data_sent.update(self.detect_pii(parsed_body))
+                        data_sent.update(self.detect_pii_cached(parsed_body))
                     elif "x-www-form-urlencoded" in content_type:
                         try:
-                            form_dict = dict(flow.request.urlencoded_form)
+                            with self.timed("parse"):
+                                form_dict = dict(req.urlencoded_form)
                             ctx.log.info(f"Parsed form fields: {list(form_dict.keys())}")
-                            data_sent.update(self.detect_pii(form_dict))
+                            data_sent.update(self.detect_pii_cached(form_dict))
                         except Exception as e:
                             ctx.log.warn(f"Form parse error: {e}")
                             data_sent.update(self.detect_pii({"raw_body": body_text}))
                     elif "multipart" in content_type:
                         try:
 
-                            form_dict = dict(flow.request.multipart_form.items())
+                            with self.timed("parse"):
+                                form_dict = dict(req.multipart_form.items())
                             ctx.log.info("Parsed multipart form")
                             data_sent.update(self.detect_pii(form_dict))
                         except Exception as e:
@@ -255,95 +668,143 @@ class SDKSniffer:
                 ctx.log.warn(f"Body parse error: {e}")
                 data_sent.update(self.detect_pii({"raw_body": body_text}))
 
+        if body.truncated:
+            ctx.log.warn(f"Body exceeds {self.max_body_size} bytes decompressed, only that much was scanned")
 
+        return data_sent
+
+    def record(self, domain, url, timestamp, data_sent):
         if not data_sent:
             ctx.log.info("No PII found in this request")
             return
 
-        clean_data = {k: sorted(list(v)) for k, v in data_sent.items()}
+        app_info = make_record(domain, url, timestamp, data_sent)
+        clean_data = app_info["Data Sent"]
 
-        app_info = {
-            "App Domain": domain,
-            "Timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "Data Sent": clean_data,
-            "Request URL": flow.request.pretty_url
-        }
-
-        duplicate_found = False
-        for existing in self.sdk_data:
-            if existing["App Domain"] == domain and existing["Data Sent"] == clean_data:
-                duplicate_found = True
-                ctx.log.info("Duplicate entry, skipping")
-                break
+        with self.timed("dedup"):
+            duplicate = self.dedup.seen(domain, clean_data)
+        if duplicate:
+            ctx.log.info("Duplicate entry, skipping")
+            return
 
-        if not duplicate_found:
-            ctx.log.info(f"[+] PII Detected: {clean_data}")
-            self.sdk_data.append(app_info)
-            self.write_log()
+        ctx.log.info(f"[+] PII Detected: {clean_data}")
+        with self.timed("write_log"):
+            self.write_log(app_info)
+
+    def detect_pii(self, parsed, parent_key="", hits=None, cards=None):
+        # `hits`, when given, collects full_key -> PII types found there.
+        if cards is None:
+            # outermost call: card candidates of the whole walk are
+            # validated in one batch at the end
+            with self.timed("detect_pii") if not parent_key else NULL_TIMER:
+                cards = CardBatch(self.card_trie)
+                result = self.detect_pii(parsed, parent_key, hits, cards)
+                cards.resolve(result, hits)
+            return result
 
-    def detect_pii(self, parsed, parent_key=""):
         result = {}
         if isinstance(parsed, dict):
             for key, value in parsed.items():
                 full_key = f"{parent_key}.{key}" if parent_key else key
                 if isinstance(value, (dict, list)):
-                    nested_result = self.detect_pii(value, full_key)
+                    nested_result = self.detect_pii(value, full_key, hits, cards)
                     for k, v in nested_result.items():
                         result.setdefault(k, set()).update(v)
                     continue
-
-                val_str = str(value).strip()
-                if not val_str or val_str.lower() in JUNK_WORDS:
-                    continue
-
-                if val_str.startswith("{") and val_str.endswith("}"):
-                    try:
-                        nested_json = json.loads(val_str)
-                        nested_result = self.detect_pii(nested_json, full_key)
-                        for k, v in nested_result.items():
-                            result.setdefault(k, set()).update(v)
-                        continue
-                    except Exception:
-                        pass
-
-                valid_imeis, invalid_imeis = detect_imei_from_keyval(key, val_str)
-                if valid_imeis:
-                    result.setdefault("imei", set()).update(valid_imeis)
-                if invalid_imeis:
-                    result.setdefault("imei_false_positive", set()).update(invalid_imeis)
-
-                for pii_type, regex in patterns.items():
-                    match = re.search(regex, f"{key}:{val_str}")
-                    if match:
-                        candidate = match.group(1) if match.lastindex else val_str
-
-                        if pii_type == "name" and key.lower() not in ALLOWED_NAME_KEYS and len(candidate) < 2:
-                            continue
-                        result.setdefault(pii_type, set()).add(candidate)
-
-                cc_candidates = re.findall(r'(?<!\.)\b\d{13,19}\b(?!\.\d)', val_str)
-                for num in cc_candidates:
-                    if num in result.get("imei", set()):
-                        continue
-                    if check_luhn(num):
-                        card_type = get_card_type(num)
-                        if card_type != "Unknown":
-                            result.setdefault("credit_card", set()).add(f"{num} ({card_type})")
+                found = self.scan_leaf(key, full_key, value, result, cards)
+                if found and hits is not None:
+                    hits.setdefault(full_key, set()).update(found)
 
         elif isinstance(parsed, list):
             for item in parsed:
-                nested_result = self.detect_pii(item, parent_key)
+                nested_result = self.detect_pii(item, parent_key, hits, cards)
                 for k, v in nested_result.items():
                     result.setdefault(k, set()).update(v)
 
         return result
 
-    def write_log(self):
-        try:
-            with open(LOG_FILE, "w") as f:
-                json.dump(self.sdk_data, f, indent=2)
-            ctx.log.info("Updated sdk_logs.json")
-        except Exception as e:
-            ctx.log.warn(f"Failed to write log: {e}")
+    def detect_pii_stream(self, chunks):
+        # Same detections as detect_pii(json.loads(...)) without building
+        # the object tree, for bodies too large to hold in memory.
+        # Its time includes decoding the rest of the body.
+        result = {}
+        cards = CardBatch(self.card_trie)
+        with self.timed("detect_pii_stream"):
+            try:
+                for key, full_key, value in iter_leaves(chunks):
+                    self.scan_leaf(key, full_key, value, result, cards)
+            except Exception as e:
+                ctx.log.warn(f"Streaming JSON scan stopped early: {e}")
+            cards.resolve(result)
+        return result
+
+    def detect_pii_cached(self, parsed):
+        # detect_pii through the schema cache: a known schema only scans
+        # the paths that carried PII when it was last fully scanned.
+        if self.schema_cache is None or not isinstance(parsed, (dict, list)):
+            return self.detect_pii(parsed)
+        with self.timed("schema_lookup"):
+            leaves = list(walk_leaves(parsed))
+            schema = frozenset(full_key for _, full_key, _ in leaves)
+            sensitive = self.schema_cache.lookup(schema)
+        if sensitive is None:
+            hits = {}
+            result = self.detect_pii(parsed, hits=hits)
+            self.schema_cache.store(schema, hits)
+            return result
+        result = {}
+        cards = CardBatch(self.card_trie)
+        with self.timed("detect_pii_cached"):
+            for key, full_key, value in leaves:
+                if full_key in sensitive:
+                    self.scan_leaf(key, full_key, value, result, cards)
+            cards.resolve(result)
+        return result
+
+    def scan_leaf(self, key, full_key, value, result, cards):
+        # Adds the detections for one key/value to `result` and returns the
+        # set of PII types it found. Card numbers go to the `cards` batch
+        # and are reported when it is resolved.
+        found = set()
+        val_str = str(value).strip()
+        if not val_str or val_str.lower() in JUNK_WORDS:
+            return found
+
+        if val_str.startswith("{") and val_str.endswith("}"):
+            try:
+                nested_json = json.loads(val_str)
+                nested_result = self.detect_pii(nested_json, full_key)
+                for k, v in nested_result.items():
+                    result.setdefault(k, set()).update(v)
+                return set(nested_result)
+            except Exception:
+                pass
+
+        valid_imeis, invalid_imeis = detect_imei_from_keyval(key, val_str)
+        if valid_imeis:
+            result.setdefault("imei", set()).update(valid_imeis)
+            found.add("imei")
+        if invalid_imeis:
+            result.setdefault("imei_false_positive", set()).update(invalid_imeis)
+            found.add("imei_false_positive")
+
+        for pii_type, match in pii_matcher.search_all(key, val_str, self.stats):
+            candidate = match.group(1) if match.lastindex else val_str
+
+            if pii_type == "name" and key.lower() not in ALLOWED_NAME_KEYS and len(candidate) < 2:
+                continue
+            result.setdefault(pii_type, set()).add(candidate)
+            found.add(pii_type)
+
+        imeis = result.get("imei", ())
+        for num in CC_CANDIDATE_RE.findall(val_str):
+            if num not in imeis:
+                cards.add(num, full_key)
+
+        return found
+
+    def write_log(self, app_info):
+        if not self.open_log().submit(app_info):
+            ctx.log.warn("Log queue full, record dropped")
 
 addons = [SDKSniffer()]
\ No newline at end of file
@@ -0,0 +1,30 @@
+# sniffer_worker.py
+# Entry points for SDKSniffer's process pool mode. Each worker process runs
+# the normal detection code on a snapshot of the request taken in the proxy.
+from mitmproxy import ctx, http
+
+_sniffer = None
+
+
+class _QuietLog:
+    # Workers have no mitmproxy master; the proxy logs the results itself.
+    def _discard(self, txt):
+        pass
+
+    debug = info = alert = warn = error = _discard
+
+
+def init_worker(settings):
+    global _sniffer
+    ctx.log = _QuietLog()
+    import sdk_sniffer
+    _sniffer = sdk_sniffer.SDKSniffer()
+    for name, value in settings.items():
+        setattr(_sniffer, name, value)
+
+
+def scan_request_state(state):
+    # Returns (data_sent, timing histograms or None); the proxy merges the
+    # histograms into its own stats.
+    data_sent = _sniffer.scan_request(http.Request.from_state(state))
+    return data_sent, _sniffer.stats.drain() if _sniffer.stats is not None else None
@@ -0,0 +1,135 @@
+# stage_stats.py
+# Opt-in timing histograms for the sniffer: one per pipeline stage and one
+# per PII pattern. Durations go into power-of-two microsecond buckets, so
+# recording is a few integer operations and the histograms stay small.
+import contextlib
+import json
+import threading
+import time
+
+BUCKETS = 32  # the last bucket holds everything from ~36 minutes up
+
+# Returned by SDKSniffer.timed() while stats are off.
+NULL_TIMER = contextlib.nullcontext()
+
+
+class Histogram:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        # bucket b counts durations of [2**(b-1), 2**b) microseconds
+        self.buckets = [0] * BUCKETS
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[min(int(seconds * 1e6).bit_length(), BUCKETS - 1)] += 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        for i, n in enumerate(other.buckets):
+            self.buckets[i] += n
+
+    def percentile(self, q):
+        # upper bound of the bucket holding the q-th duration, in seconds
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for b, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return min((2 ** b) / 1e6, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 3),
+            "mean_us": round(self.total / self.count * 1e6, 1) if self.count else 0.0,
+            "p50_us": round(self.percentile(0.5) * 1e6, 1),
+            "p99_us": round(self.percentile(0.99) * 1e6, 1),
+            "max_us": round(self.max * 1e6, 1),
+            "buckets_us": {f"<{2 ** b}": n for b, n in enumerate(self.buckets) if n},
+        }
+
+
+class _Timer:
+    __slots__ = ("stats", "name", "start")
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class StageStats:
+    """Histograms by name. Stage names are plain ("decode"), pattern
+    names are prefixed with "pattern:"."""
+
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()  # the pool's callback thread records too
+
+    def __getstate__(self):
+        # sent to pool workers at startup; the lock stays behind
+        return {"histograms": self.histograms}
+
+    def __setstate__(self, state):
+        self.histograms = state["histograms"]
+        self.lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self.lock:
+            hist = self.histograms.get(name)
+            if hist is None:
+                hist = self.histograms[name] = Histogram()
+            hist.add(seconds)
+
+    def time(self, name):
+        return _Timer(self, name)
+
+    def merge(self, histograms):
+        with self.lock:
+            for name, other in histograms.items():
+                self.histograms.setdefault(name, Histogram()).merge(other)
+
+    def drain(self):
+        # Hands the histograms over (e.g. from a worker process) and starts afresh.
+        with self.lock:
+            histograms, self.histograms = self.histograms, {}
+        return histograms
+
+    def summary(self):
+        with self.lock:
+            items = sorted(self.histograms.items(), key=lambda item: item[1].total, reverse=True)
+            stages = {n: h.to_dict() for n, h in items if not n.startswith("pattern:")}
+            patterns = {n[len("pattern:"):]: h.to_dict() for n, h in items if n.startswith("pattern:")}
+        return {"stages": stages, "patterns": patterns}
+
+    def format(self, top=10):
+        summary = self.summary()
+        lines = []
+        for title, section in (("stage", summary["stages"]), ("pattern", summary["patterns"])):
+            for name, h in list(section.items())[:top]:
+                lines.append(
+                    f"{title} {name}: {h['count']} calls, {h['total_ms']} ms total, "
+                    f"p50 {h['p50_us']} us, p99 {h['p99_us']} us"
+                )
+        return "\n".join(lines)
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2)